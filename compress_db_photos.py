@@ -19,6 +19,8 @@ import os
 import configparser
 import paramiko
 import tempfile
+from garden_db_schema import ensure_schema
+from garden_db_writer import photo_hash
 
 # Configuration
 DB_FILE = 'garden_sensors.db'
@@ -535,6 +537,8 @@ def compress_photo(photo_data, photo_id, photo_type='main'):
 def process_photos_thread(dry_run, output_queue, progress_queue):
     """Process photos in a separate thread"""
     conn = get_db_connection()
+    if not dry_run:
+        ensure_schema(conn)  # Adds the photo_hash column if missing
     cursor = conn.cursor()
     
     output_queue.put("Analyzing photos in database...\n")
@@ -613,9 +617,9 @@ def process_photos_thread(dry_run, output_queue, progress_queue):
                 try:
                     cursor.execute('''
                         UPDATE plant_photos 
-                        SET photo_data = ?, file_size = ?
+                        SET photo_data = ?, file_size = ?, photo_hash = ?
                         WHERE id = ?
-                    ''', (compressed_data, new_size, photo_id))
+                    ''', (compressed_data, new_size, photo_hash(compressed_data), photo_id))
                     output_queue.put(f"  ✓ Updated in database\n")
                     mark_db_changed()
                 except Exception as e:
@@ -14,6 +14,8 @@ import platform
 import configparser
 import paramiko
 import tempfile
+from garden_db_schema import create_base_tables, ensure_schema
+from garden_db_writer import photo_hash
 
 # Initialize pygame
 pygame.init()
@@ -1980,25 +1982,7 @@ def save_garden_to_db():
         cursor = conn.cursor()
         
         # Create tables if they don't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS garden_layouts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                boundary_points TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_active INTEGER DEFAULT 1
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS plant_types (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                latin_name TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        create_base_tables(conn, ('garden_layouts', 'plant_types'))
         
         # Check if garden_plants table has unique_id column
         cursor.execute("PRAGMA table_info(garden_plants)")
@@ -2043,30 +2027,10 @@ def save_garden_to_db():
                 )
             ''')
         
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS plant_photos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                garden_plant_id INTEGER NOT NULL,
-                photo_data BLOB,
-                photo_type TEXT DEFAULT 'main',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (garden_plant_id) REFERENCES garden_plants (id)
-            )
-        ''')
+        create_base_tables(conn, ('plant_photos', 'garden_images'))
         
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS garden_images (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                garden_layout_id INTEGER NOT NULL,
-                image_path TEXT NOT NULL,
-                position_x REAL NOT NULL,
-                position_y REAL NOT NULL,
-                width INTEGER NOT NULL,
-                height INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (garden_layout_id) REFERENCES garden_layouts (id)
-            )
-        ''')
+        # Add indexes and columns shared with the API server (photo_hash)
+        ensure_schema(conn)
         
         # Get garden name
         garden_name = "Garden"
@@ -2180,9 +2144,10 @@ def save_garden_to_db():
             for photo in all_photos:
                 if photo.get('photo_data'):
                     cursor.execute('''
-                        INSERT INTO plant_photos (garden_plant_id, photo_data, photo_type)
-                        VALUES (?, ?, ?)
-                    ''', (garden_plant_id, photo['photo_data'], photo.get('photo_type', 'main')))
+                        INSERT INTO plant_photos (garden_plant_id, photo_data, photo_type, photo_hash)
+                        VALUES (?, ?, ?, ?)
+                    ''', (garden_plant_id, photo['photo_data'], photo.get('photo_type', 'main'),
+                          photo_hash(photo['photo_data'])))
         
         # Save images
         for image_data in images:
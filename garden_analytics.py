@@ -0,0 +1,461 @@
+"""
+Garden Analytics
+NumPy routines over sensor reading series, and the analytics jobs run by
+the logger after each poll: incremental anomaly detection and the
+moisture drying forecasts
+"""
+
+import warnings
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Anomaly detection: each reading is scored against the median and MAD of
+# the ANOMALY_WINDOW active readings before it. A spike is a reading whose
+# robust z-score exceeds ANOMALY_Z while the next reading is back within
+# ANOMALY_RECOVERY_Z, so a lasting level change (watering) is not flagged.
+ANOMALY_METRICS = ('humidity', 'temperature')
+ANOMALY_WINDOW = 48
+ANOMALY_MIN_BASELINE = 12
+ANOMALY_Z = 6.0
+ANOMALY_RECOVERY_Z = 3.0
+# Smallest MAD used, so a flat baseline does not turn noise into huge scores
+ANOMALY_MAD_FLOOR = {'humidity': 0.5, 'temperature': 0.2}
+# Readings outside these ranges are sensor faults
+ANOMALY_VALID_RANGE = {'humidity': (0, 100), 'temperature': (-40, 80)}
+# New readings per device scored per pass, to bound memory
+ANOMALY_MAX_POINTS = 500
+# How far back the first run starts
+ANOMALY_BACKFILL_DAYS = 7
+
+# Drying forecasts: humidity since a sensor's last watering is fit with an
+# exponential decay, humidity = a * exp(-k * hours), by least squares on
+# log(humidity). The fit gives the time left until the plant's humidity_low.
+FORECAST_LOOKBACK_DAYS = 7
+FORECAST_MAX_POINTS = 72  # latest readings of the drying segment (~2 days at 40 min)
+FORECAST_MIN_POINTS = 6
+FORECAST_MIN_HOURS = 2
+FORECAST_HORIZON_DAYS = 30
+# A rise of this many humidity points between two readings is a watering
+WATERING_RISE = 10
+
+
+def lttb_indices(x, y, n_out):
+    """Select indices of a shape-preserving downsample (Largest-Triangle-Three-Buckets).
+
+    x must be sorted ascending. The first and last points are always kept and
+    every other bucket contributes the point forming the largest triangle
+    with the previously selected point and the average of the next bucket.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # n_out - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # The bucket after the last one is the final point itself
+    avg_x = np.append(avg_x[1:], x[-1])
+    avg_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - avg_x[i]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y[i] - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def rolling_robust_z(series, window, min_baseline=1, mad_floor=0.0):
+    """Robust z-scores of many series at once against trailing windows.
+
+    series is 2-D, one row per series: `window` baseline columns (NaN where
+    a series has less history) followed by the points to score, NaN-padded
+    on the right. Each point is scored against the `window` values before
+    it. Returns (median, mad, z), each with one column per scored point;
+    z is NaN where fewer than min_baseline baseline values exist.
+    mad_floor may be a scalar or one value per row.
+    """
+    series = np.asarray(series, dtype=np.float64)
+    # Window k covers the columns just before scored point k
+    windows = sliding_window_view(series, window, axis=1)[:, :-1]
+    with warnings.catch_warnings():
+        # All-NaN windows (no history yet) yield NaN, which is wanted
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median = np.nanmedian(windows, axis=2)
+        mad = np.nanmedian(np.abs(windows - median[..., None]), axis=2)
+    count = np.sum(~np.isnan(windows), axis=2)
+    scale = np.maximum(mad, np.reshape(mad_floor, (-1, 1)))
+    z = 0.6745 * (series[:, window:] - median) / scale
+    z[count < min_baseline] = np.nan
+    return median, mad, z
+
+
+def _score_anomalies(batch, window):
+    """Anomaly rows for a batch of {device_id: (context_rows, new_rows)}.
+
+    Rows are (id, sensor_name, plant_unique_id, date, time, humidity,
+    temperature) tuples in id order. The last new row of each device is
+    only used as the successor of the one before it.
+    """
+    devices = list(batch)
+    width = max(len(new) for _, new in batch.values())
+    anomalies = []
+    
+    for metric_index, metric in enumerate(ANOMALY_METRICS, start=5):
+        series = np.full((len(devices), window + width), np.nan)
+        evaluated = np.zeros((len(devices), width), dtype=bool)
+        for row, device_id in enumerate(devices):
+            context, new = batch[device_id]
+            if context:
+                series[row, window - len(context):window] = np.array(
+                    [r[metric_index] for r in context], dtype=np.float64
+                )
+            series[row, window:window + len(new)] = np.array(
+                [r[metric_index] for r in new], dtype=np.float64
+            )
+            evaluated[row, :len(new) - 1] = True
+        
+        median, mad, z = rolling_robust_z(
+            series, window, ANOMALY_MIN_BASELINE, ANOMALY_MAD_FLOOR[metric]
+        )
+        values = series[:, window:]
+        scale = np.maximum(mad, ANOMALY_MAD_FLOOR[metric])
+        # Score of the following reading against the same baseline
+        next_z = np.full_like(z, np.nan)
+        next_z[:, :-1] = 0.6745 * (values[:, 1:] - median[:, :-1]) / scale[:, :-1]
+        
+        with np.errstate(invalid='ignore'):
+            spikes = evaluated & (np.abs(z) >= ANOMALY_Z) & (np.abs(next_z) <= ANOMALY_RECOVERY_Z)
+            low, high = ANOMALY_VALID_RANGE[metric]
+            out_of_range = evaluated & ((values < low) | (values > high))
+        
+        for kind, mask in (('out_of_range', out_of_range), ('spike', spikes & ~out_of_range)):
+            for row, column in zip(*np.nonzero(mask)):
+                reading = batch[devices[row]][1][column]
+                anomalies.append((
+                    reading[0], devices[row], reading[1], reading[2], metric, kind,
+                    float(values[row, column]),
+                    None if np.isnan(median[row, column]) else float(median[row, column]),
+                    None if np.isnan(mad[row, column]) else float(mad[row, column]),
+                    None if np.isnan(z[row, column]) else round(float(z[row, column]), 2),
+                    reading[3], reading[4]
+                ))
+    return anomalies
+
+
+def _save_progress(conn, markers):
+    """Upsert (name, value) progress markers into analytics_state"""
+    conn.executemany('''
+        INSERT INTO analytics_state (name, value) VALUES (?, ?)
+        ON CONFLICT (name) DO UPDATE SET value = excluded.value
+    ''', markers)
+
+
+def detect_anomalies(conn, window=ANOMALY_WINDOW, max_points=ANOMALY_MAX_POINTS):
+    """Score the readings added since the last run and store anomalies found.
+
+    Progress is kept in analytics_state: 'anomalies' is the highest reading
+    id seen, 'anomalies:<device_id>' the last reading scored per device.
+    Only devices with new readings are loaded, with `window` readings of
+    context each, so the cost follows the amount of new data. The caller
+    commits. Returns the number of anomalies stored.
+    """
+    state = dict(conn.execute("SELECT name, value FROM analytics_state WHERE name LIKE 'anomalies%'"))
+    if 'anomalies' in state:
+        start = state['anomalies']
+    else:
+        row = conn.execute(
+            "SELECT MIN(id) FROM sensor_readings WHERE timestamp >= datetime('now', ?)",
+            (f'-{ANOMALY_BACKFILL_DAYS} days',)
+        ).fetchone()
+        start = row[0] - 1 if row[0] is not None else conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM sensor_readings"
+        ).fetchone()[0]
+    top = conn.execute("SELECT COALESCE(MAX(id), 0) FROM sensor_readings").fetchone()[0]
+    
+    # Each device resumes from its own progress, which trails the global
+    # watermark by the reading held back for want of a successor
+    pending = {
+        device_id: state.get(f'anomalies:{device_id}', start)
+        for (device_id,) in conn.execute(
+            "SELECT DISTINCT device_id FROM sensor_readings WHERE id > ? AND device_id IS NOT NULL",
+            (start,)
+        )
+    }
+    # A device seen for the first time starts from the watermark, saved now
+    # so a lone new reading is still scored on a later run
+    _save_progress(conn, [
+        (f'anomalies:{device_id}', last_id) for device_id, last_id in pending.items()
+        if f'anomalies:{device_id}' not in state
+    ])
+    
+    stored = 0
+    while pending:
+        batch = {}
+        for device_id, last_id in pending.items():
+            context = conn.execute('''
+                SELECT id, sensor_name, plant_unique_id, date, time, humidity, temperature
+                FROM sensor_readings
+                WHERE device_id = ? AND sensor_state = 1 AND id <= ?
+                ORDER BY id DESC LIMIT ?
+            ''', (device_id, last_id, window)).fetchall()[::-1]
+            new = conn.execute('''
+                SELECT id, sensor_name, plant_unique_id, date, time, humidity, temperature
+                FROM sensor_readings
+                WHERE device_id = ? AND sensor_state = 1 AND id > ?
+                ORDER BY id LIMIT ?
+            ''', (device_id, last_id, max_points + 1)).fetchall()
+            if len(new) >= 2:
+                batch[device_id] = (context, new)
+        if not batch:
+            break
+        
+        anomalies = _score_anomalies(batch, window)
+        before = conn.total_changes
+        conn.executemany('''
+            INSERT OR IGNORE INTO sensor_anomalies
+            (reading_id, device_id, sensor_name, plant_unique_id, metric, kind,
+             value, median, mad, z_score, date, time)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', anomalies)
+        stored += conn.total_changes - before
+        
+        # Everything but each device's latest reading has been scored
+        progress = {device_id: new[-2][0] for device_id, (_, new) in batch.items()}
+        _save_progress(conn, [(f'anomalies:{device_id}', last_id) for device_id, last_id in progress.items()])
+        pending = {
+            device_id: progress[device_id]
+            for device_id, (_, new) in batch.items()
+            if len(new) == max_points + 1
+        }
+    
+    _save_progress(conn, [('anomalies', top)])
+    return stored
+
+
+def fit_drying_curves(hours, humidity, watering_rise=WATERING_RISE, max_points=FORECAST_MAX_POINTS):
+    """Least-squares fit of log(humidity) against time for many sensors at once.
+
+    hours and humidity are 2-D, one row per sensor, readings in time order
+    and NaN-padded on the right. Each row is fit from the reading after its
+    last watering (a rise of at least watering_rise) on, using at most its
+    max_points latest readings. Time is counted from each row's last
+    reading, so exp(intercept) is the fitted humidity now and -slope the
+    relative drying rate per hour.
+
+    Returns a dict of per-row arrays: slope, intercept, points, hours
+    (span of the fitted readings), r_squared and start (first column used).
+    """
+    hours = np.asarray(hours, dtype=np.float64)
+    humidity = np.asarray(humidity, dtype=np.float64)
+    rows, width = humidity.shape
+    valid = ~np.isnan(humidity) & ~np.isnan(hours)
+    count = valid.sum(axis=1)
+    columns = np.arange(width)
+    
+    with np.errstate(invalid='ignore'):
+        # A single reading far above both neighbours is a glitch, not a watering
+        spikes = np.zeros_like(valid)
+        spikes[:, 1:-1] = (
+            (humidity[:, 1:-1] - humidity[:, :-2] >= watering_rise)
+            & (humidity[:, 1:-1] - humidity[:, 2:] >= watering_rise)
+        )
+        # Glitches take the previous value when looking for waterings
+        level = humidity.copy()
+        level[:, 1:] = np.where(spikes[:, 1:], humidity[:, :-1], humidity[:, 1:])
+        rises = np.diff(level, axis=1) >= watering_rise
+    start = np.max(np.where(rises, columns[1:], 0), axis=1, initial=0)
+    start = np.maximum(start, count - max_points)
+    used = valid & ~spikes & (columns >= start[:, None]) & (humidity > 0)
+    
+    last = np.maximum(count - 1, 0)
+    t = np.where(used, hours - hours[np.arange(rows), last][:, None], 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = np.where(used, np.log(np.where(used, humidity, 1.0)), 0.0)
+        n = used.sum(axis=1).astype(np.float64)
+        sx, sy = t.sum(axis=1), y.sum(axis=1)
+        sxx, sxy, syy = (t * t).sum(axis=1), (t * y).sum(axis=1), (y * y).sum(axis=1)
+        denom = n * sxx - sx * sx
+        cov = n * sxy - sx * sy
+        slope = cov / denom
+        intercept = (sy - slope * sx) / n
+        r_squared = cov * cov / (denom * (n * syy - sy * sy))
+    span = np.max(np.where(used, -t, 0.0), axis=1)
+    fitted = denom > 0
+    return {
+        'slope': np.where(fitted, slope, np.nan),
+        'intercept': np.where(fitted, intercept, np.nan),
+        'points': n.astype(np.int64),
+        'hours': span,
+        'r_squared': np.where(fitted, np.clip(np.nan_to_num(r_squared, nan=1.0), 0.0, 1.0), np.nan),
+        'start': start
+    }
+
+
+def _wall_clock_text(epoch):
+    """Format epoch seconds of local wall-clock time like the date/time columns"""
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def update_moisture_forecasts(conn, thresholds):
+    """Refit moisture_forecasts for the plant sensors with new readings.
+
+    thresholds is a refreshed garden_thresholds.ThresholdResolver giving
+    each plant's humidity_low for today. Readings flagged as humidity
+    anomalies are left out of the fits. Progress is kept in analytics_state
+    like detect_anomalies: 'forecasts' is the highest reading id seen,
+    'forecasts:<device_id>' the last reading fitted per device. A sensor is
+    refit when it has newer readings, no progress yet, or its plant or
+    humidity_low changed; the other rows, and their updated_at, are left
+    alone. The caller commits. Returns the number of forecasts written.
+    """
+    sensors = {}
+    for device_id, unique_id, sensor_name, plant_type_id in conn.execute('''
+        SELECT sensor_id, unique_id, sensor_name, plant_type_id
+        FROM garden_plants
+        WHERE has_sensor = 1 AND sensor_id IS NOT NULL
+        ORDER BY id
+    '''):
+        if device_id not in sensors:
+            sensors[device_id] = (
+                unique_id, sensor_name, thresholds.resolve(plant_type_id)['humidity_low']
+            )
+    
+    cutoff = datetime.now() - timedelta(days=FORECAST_LOOKBACK_DAYS)
+    stored = {
+        row[0]: tuple(row[1:])
+        for row in conn.execute(
+            "SELECT device_id, plant_unique_id, sensor_name, humidity_low FROM moisture_forecasts"
+        )
+    }
+    # Drop sensors that were removed and forecasts that have gone stale
+    conn.executemany(
+        "DELETE FROM moisture_forecasts WHERE device_id = ?",
+        [(device_id,) for device_id in stored if device_id not in sensors]
+    )
+    conn.execute(
+        "DELETE FROM moisture_forecasts WHERE last_reading < ?",
+        (cutoff.strftime('%Y-%m-%d %H:%M:%S'),)
+    )
+    
+    state = dict(conn.execute("SELECT name, value FROM analytics_state WHERE name LIKE 'forecasts%'"))
+    top = conn.execute("SELECT COALESCE(MAX(id), 0) FROM sensor_readings").fetchone()[0]
+    latest = dict(conn.execute('''
+        SELECT device_id, MAX(id) FROM sensor_readings
+        WHERE id > ? AND device_id IS NOT NULL
+        GROUP BY device_id
+    ''', (state.get('forecasts', top),)))
+    pending = [
+        device_id for device_id in sensors
+        if f'forecasts:{device_id}' not in state
+        or latest.get(device_id, 0) > state[f'forecasts:{device_id}']
+        or device_id in stored and stored[device_id] != sensors[device_id]
+    ]
+    _save_progress(conn, [
+        (f'forecasts:{device_id}', latest.get(device_id, state.get(f'forecasts:{device_id}', top)))
+        for device_id in pending
+    ] + [('forecasts', top)])
+    if not pending:
+        return 0
+    
+    device_ids = pending
+    placeholders = ','.join('?' for _ in device_ids)
+    series = {}
+    for device_id, epoch, humidity in conn.execute(f'''
+        SELECT device_id, CAST(strftime('%s', date || ' ' || time) AS INTEGER), humidity
+        FROM sensor_readings r
+        WHERE device_id IN ({placeholders}) AND sensor_state = 1 AND humidity IS NOT NULL
+          AND (date, time) >= (?, ?)
+          AND NOT EXISTS (
+              SELECT 1 FROM sensor_anomalies a
+              WHERE a.reading_id = r.id AND a.metric = 'humidity'
+          )
+        ORDER BY device_id, date, time, id
+    ''', device_ids + [cutoff.strftime('%Y-%m-%d'), cutoff.strftime('%H:%M:%S')]):
+        if epoch is not None:
+            series.setdefault(device_id, []).append((epoch, humidity))
+    
+    devices = [device_id for device_id in device_ids if series.get(device_id)]
+    forecasts = []
+    if devices:
+        width = max(len(series[device_id]) for device_id in devices)
+        epochs = np.full((len(devices), width), np.nan)
+        humidity = np.full((len(devices), width), np.nan)
+        for row, device_id in enumerate(devices):
+            values = np.array(series[device_id], dtype=np.float64)
+            epochs[row, :len(values)] = values[:, 0]
+            humidity[row, :len(values)] = values[:, 1]
+        fit = fit_drying_curves(epochs / 3600.0, humidity)
+        
+        for row, device_id in enumerate(devices):
+            unique_id, sensor_name, humidity_low = sensors[device_id]
+            readings = series[device_id]
+            last_epoch, current = readings[-1]
+            slope, intercept = fit['slope'][row], fit['intercept'][row]
+            points = int(fit['points'][row])
+            rate = hours_left = threshold_at = None
+            
+            if current <= humidity_low:
+                status = 'below_threshold'
+                hours_left = 0.0
+            elif points < FORECAST_MIN_POINTS or fit['hours'][row] < FORECAST_MIN_HOURS or np.isnan(slope):
+                status = 'insufficient_data'
+            else:
+                now_fitted = float(np.exp(intercept))
+                rate = round(-slope * now_fitted, 3)
+                if slope >= 0:
+                    status = 'not_drying'
+                elif now_fitted <= humidity_low:
+                    status = 'below_threshold'
+                    hours_left = 0.0
+                else:
+                    hours_left = float((intercept - np.log(humidity_low)) / -slope)
+                    if hours_left > FORECAST_HORIZON_DAYS * 24:
+                        status = 'not_drying'
+                        hours_left = None
+                    else:
+                        status = 'ok'
+                        threshold_at = _wall_clock_text(last_epoch + hours_left * 3600)
+                        hours_left = round(hours_left, 1)
+            
+            forecasts.append((
+                device_id, unique_id, sensor_name, humidity_low, current, rate,
+                hours_left, threshold_at, status, points,
+                None if np.isnan(fit['r_squared'][row]) else round(float(fit['r_squared'][row]), 3),
+                _wall_clock_text(readings[int(fit['start'][row])][0]), _wall_clock_text(last_epoch)
+            ))
+    
+    # A refit sensor with nothing left to fit loses its forecast
+    conn.executemany(
+        "DELETE FROM moisture_forecasts WHERE device_id = ?",
+        [(device_id,) for device_id in device_ids if not series.get(device_id)]
+    )
+    conn.executemany('''
+        INSERT INTO moisture_forecasts
+        (device_id, plant_unique_id, sensor_name, humidity_low, current_humidity, drying_rate,
+         hours_to_threshold, threshold_at, status, fitted_points, r_squared,
+         segment_start, last_reading)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (device_id) DO UPDATE SET
+            plant_unique_id = excluded.plant_unique_id, sensor_name = excluded.sensor_name,
+            humidity_low = excluded.humidity_low, current_humidity = excluded.current_humidity,
+            drying_rate = excluded.drying_rate, hours_to_threshold = excluded.hours_to_threshold,
+            threshold_at = excluded.threshold_at, status = excluded.status,
+            fitted_points = excluded.fitted_points, r_squared = excluded.r_squared,
+            segment_start = excluded.segment_start, last_reading = excluded.last_reading,
+            updated_at = CURRENT_TIMESTAMP
+    ''', forecasts)
+    return len(forecasts)
@@ -0,0 +1,497 @@
+"""
+Garden API Benchmark
+Builds a synthetic garden database and measures garden_api_server.py
+latency and throughput under concurrent load.
+
+    python garden_api_benchmark.py generate --output bench/garden_sensors.db
+    cd bench && python ../garden_api_server.py        # in another terminal
+    python garden_api_benchmark.py run --label my-change --output results.json
+    python garden_api_benchmark.py compare before.json after.json
+    python garden_api_benchmark.py ingest --batch 500 --format line   # POST /api/readings
+
+Results are written as JSON (with the git commit they were measured on) so
+runs can be compared across commits.
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from garden_db_schema import create_base_tables, ensure_schema
+
+PLANT_TYPES = [
+    ('Tomato', 'Solanum lycopersicum'), ('Basil', 'Ocimum basilicum'),
+    ('Rose', 'Rosa'), ('Lemon', 'Citrus limon'), ('Olive', 'Olea europaea'),
+    ('Fig', 'Ficus carica'), ('Lavender', 'Lavandula'), ('Rosemary', 'Salvia rosmarinus')
+]
+SEASONS = ['Spring', 'Summer', 'Autumn', 'Winter']
+
+READING_BATCH = 50000
+
+
+def make_photo(rng, width, height, size_kb):
+    """A JPEG plant photo stand-in, or random bytes of about size_kb without Pillow"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return rng.randbytes(size_kb * 1024)
+    gradient = Image.radial_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), rng.randint(20, 60))
+    photo = Image.merge('RGB', (noise, gradient, Image.blend(noise, gradient, 0.5)))
+    output = io.BytesIO()
+    photo.save(output, 'JPEG', quality=85)
+    return output.getvalue()
+
+
+def generate(args):
+    """Build a synthetic database with layouts, plants, photos and readings"""
+    if os.path.exists(args.output):
+        if not args.force:
+            print(f"Error: {args.output} exists (use --force to overwrite)")
+            sys.exit(1)
+        os.remove(args.output)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+
+    rng = random.Random(args.seed)
+    conn = sqlite3.connect(args.output)
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    # The app's own tables; indexes, triggers and rollups come from ensure_schema after the bulk load
+    create_base_tables(conn)
+
+    for type_id, (name, latin_name) in enumerate(PLANT_TYPES, start=1):
+        conn.execute("INSERT INTO plant_types (name, latin_name) VALUES (?, ?)", (name, latin_name))
+        for season in SEASONS:
+            low = rng.randint(20, 35)
+            conn.execute('''
+                INSERT INTO plant_thresholds
+                (plant_type_id, season, humidity_low, humidity_high, temperature_low, temperature_high)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (type_id, season, low, low + rng.randint(30, 45), rng.randint(0, 10), rng.randint(30, 40)))
+
+    print(f"Creating {args.layouts} layouts with {args.plants} plants each...")
+    sensors = []
+    for layout in range(1, args.layouts + 1):
+        conn.execute(
+            "INSERT INTO garden_layouts (name, boundary_points) VALUES (?, ?)",
+            (f'Garden {layout}', json.dumps([[0, 0], [1200, 0], [1200, 800], [0, 800]]))
+        )
+        for image in range(3):
+            conn.execute('''
+                INSERT INTO garden_images (garden_layout_id, image_path, position_x, position_y, width, height)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (layout, 'tree.png', rng.uniform(0, 1100), rng.uniform(0, 700), 100, 100))
+        for plant in range(args.plants):
+            has_sensor = rng.random() < args.sensor_ratio
+            unique_id = f'L{layout}P{plant}'
+            device_id = f'bench{layout:02d}{plant:04d}' if has_sensor else None
+            sensor_name = f'Sensor {layout}-{plant}' if has_sensor else None
+            cursor = conn.execute('''
+                INSERT INTO garden_plants
+                (garden_layout_id, plant_type_id, custom_name, position_x, position_y,
+                 has_sensor, sensor_id, sensor_name, unique_id, image_path)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                layout, rng.randint(1, len(PLANT_TYPES)), f'Plant {layout}-{plant}',
+                rng.uniform(0, 1200), rng.uniform(0, 800), int(has_sensor),
+                device_id, sensor_name, unique_id, 'plant.png'
+            ))
+            conn.execute(
+                "INSERT INTO plant_photos (garden_plant_id, photo_data) VALUES (?, ?)",
+                (cursor.lastrowid, make_photo(rng, args.photo_width, args.photo_height, args.photo_kb))
+            )
+            if has_sensor:
+                sensors.append((unique_id, sensor_name, device_id, cursor.lastrowid))
+    conn.commit()
+
+    total = len(sensors) * args.readings
+    print(f"Generating {args.readings} readings for each of {len(sensors)} sensors ({total:,} rows)...")
+    start_time = time.time()
+    # Readings are written in time order, interleaved across sensors, as the logger does
+    now = datetime.now().replace(microsecond=0)
+    first = now - timedelta(seconds=args.interval * (args.readings - 1))
+    state = {device_id: [rng.uniform(30, 70), 100.0] for _, _, device_id, _ in sensors}
+    batch = []
+    for step in range(args.readings):
+        moment = first + timedelta(seconds=args.interval * step)
+        date, clock = moment.strftime('%Y-%m-%d'), moment.strftime('%H:%M:%S')
+        utc = moment.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        day_phase = math.sin((moment.hour + moment.minute / 60) / 24 * 2 * math.pi)
+        for unique_id, sensor_name, device_id, plant_id in sensors:
+            humidity, battery = state[device_id]
+            # Soil dries slowly and jumps back up when watered
+            humidity -= rng.uniform(0, 0.6)
+            if humidity < 15 or rng.random() < 0.002:
+                humidity = rng.uniform(60, 85)
+            battery = battery - 0.002 if battery > 5 else 100.0
+            state[device_id] = [humidity, battery]
+            if rng.random() < 0.02:
+                batch.append((unique_id, sensor_name, device_id, date, clock, None, None, None, 0, utc, plant_id))
+                continue
+            batch.append((
+                unique_id, sensor_name, device_id, date, clock,
+                round(18 + 8 * day_phase + rng.gauss(0, 0.8), 1), round(humidity, 1),
+                int(battery), 1, utc, plant_id
+            ))
+        if len(batch) >= READING_BATCH:
+            conn.executemany('''
+                INSERT INTO sensor_readings
+                (plant_unique_id, sensor_name, device_id, date, time, temperature,
+                 humidity, battery_charge, sensor_state, timestamp, garden_plant_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', batch)
+            batch = []
+    if batch:
+        conn.executemany('''
+            INSERT INTO sensor_readings
+            (plant_unique_id, sensor_name, device_id, date, time, temperature,
+             humidity, battery_charge, sensor_state, timestamp, garden_plant_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', batch)
+    conn.commit()
+    print(f"  inserted in {time.time() - start_time:.1f}s")
+
+    print("Building indexes and derived tables...")
+    start_time = time.time()
+    ensure_schema(conn)
+    print(f"  done in {time.time() - start_time:.1f}s")
+    conn.close()
+    print(f"Database written to {args.output} ({os.path.getsize(args.output) / 1024 / 1024:.1f} MB)")
+
+
+def fetch(url, timeout):
+    """GET url as a browser would; returns (status, bytes received)"""
+    request = urllib.request.Request(url, headers={'Accept-Encoding': 'gzip'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, len(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, len(e.read())
+
+
+def discover(base_url, timeout):
+    """Sensor IDs and plant IDs from the dashboard payload"""
+    with urllib.request.urlopen(f'{base_url}/api/dashboard-data', timeout=timeout) as response:
+        payload = json.loads(response.read())
+    plants = (payload.get('garden') or {}).get('plants', [])
+    device_ids = [p['sensor_id'] for p in plants if p.get('has_sensor') and p.get('sensor_id')]
+    plant_ids = [p['id'] for p in plants]
+    if not device_ids or not plant_ids:
+        print("Error: the dashboard has no plants with sensors to benchmark against")
+        sys.exit(1)
+    return device_ids, plant_ids
+
+
+def build_targets(args, device_ids, plant_ids):
+    """Endpoint name -> function returning the next URL path to request"""
+    export_from = (datetime.now() - timedelta(days=args.export_days)).strftime('%Y-%m-%d')
+    targets = {
+        'dashboard-data': lambda rng: '/api/dashboard-data',
+        'sensor-data': lambda rng: f'/api/sensor-data?device_id={rng.choice(device_ids)}&limit=100',
+        'sensor-stats': lambda rng: '/api/sensor-stats',
+        'export-csv': lambda rng: f'/api/export-csv?device_id={rng.choice(device_ids)}&dateFrom={export_from}',
+        'plant-photo': lambda rng: f'/api/plant-photo/{rng.choice(plant_ids)}',
+        'plant-photo-thumb': lambda rng: f'/api/plant-photo/{rng.choice(plant_ids)}?w=160&h=160&fmt=jpeg'
+    }
+    if args.endpoints:
+        unknown = set(args.endpoints) - set(targets)
+        if unknown:
+            print(f"Error: unknown endpoints {', '.join(sorted(unknown))} (choose from {', '.join(targets)})")
+            sys.exit(1)
+        targets = {name: targets[name] for name in args.endpoints}
+    return targets
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, elapsed):
+    """Latency percentiles (ms), throughput and error count of (ms, status, size) samples"""
+    latencies = sorted(ms for ms, _, _ in samples)
+    errors = sum(1 for _, status, _ in samples if status >= 400)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 0.50), 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95), 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99), 2) if latencies else None,
+        'max_ms': round(latencies[-1], 2) if latencies else None,
+        'mean_kb': round(sum(size for _, _, size in samples) / len(samples) / 1024, 1) if samples else None
+    }
+
+
+def git_commit():
+    """Commit hash of the working tree, or None outside a git checkout"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(results):
+    print(f"\n{'endpoint':<20}{'requests':>9}{'errors':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'KB':>8}")
+    for name, r in results.items():
+        print(f"{name:<20}{r['requests']:>9}{r['errors']:>8}{r['throughput_rps'] or 0:>9.1f}"
+              f"{r['p50_ms'] or 0:>9.1f}{r['p95_ms'] or 0:>9.1f}{r['p99_ms'] or 0:>9.1f}{r['mean_kb'] or 0:>8.1f}")
+
+
+def run(args):
+    """Hit the endpoints concurrently for a fixed duration and report latencies"""
+    base_url = args.url.rstrip('/')
+    device_ids, plant_ids = discover(base_url, args.timeout)
+    targets = build_targets(args, device_ids, plant_ids)
+    names = list(targets)
+    print(f"Benchmarking {base_url} with {args.concurrency} workers for {args.duration}s "
+          f"({len(device_ids)} sensors, {len(plant_ids)} plants)")
+
+    samples = {name: [] for name in names}
+    lock = threading.Lock()
+    start = time.perf_counter()
+    measure_from = start + args.warmup
+    stop_at = measure_from + args.duration
+
+    def worker(index):
+        rng = random.Random(args.seed + index)
+        turn = index
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                return
+            # Each worker cycles through all endpoints, so they are hit concurrently
+            name = names[turn % len(names)]
+            turn += 1
+            request_start = time.perf_counter()
+            try:
+                status, size = fetch(base_url + targets[name](rng), args.timeout)
+            except (urllib.error.URLError, socket.timeout, ConnectionError):
+                status, size = 599, 0
+            elapsed_ms = (time.perf_counter() - request_start) * 1000
+            if request_start >= measure_from:
+                with lock:
+                    samples[name].append((elapsed_ms, status, size))
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(worker, range(args.concurrency)))
+
+    results = {name: summarize(samples[name], args.duration) for name in names}
+    results['total'] = summarize([s for name in names for s in samples[name]], args.duration)
+    print_report(results)
+
+    report = {
+        'label': args.label,
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(),
+        'url': base_url,
+        'duration_s': args.duration,
+        'warmup_s': args.warmup,
+        'concurrency': args.concurrency,
+        'host': socket.gethostname(),
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+def post(url, body, content_type, timeout):
+    """POST body; returns (status, decoded JSON response or None)"""
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': content_type})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+def ingest_batch(device_ids, start, size, fmt, rng):
+    """Body of one /api/readings batch: size readings from start, one second apart per device"""
+    readings = [
+        (device_ids[i % len(device_ids)], start + i // len(device_ids),
+         round(rng.uniform(20, 80), 1), round(rng.uniform(5, 35), 1), rng.randint(10, 100))
+        for i in range(size)
+    ]
+    if fmt == 'json':
+        return json.dumps([
+            {'device_id': device, 'timestamp': ts, 'humidity': humidity,
+             'temperature': temperature, 'battery_charge': battery}
+            for device, ts, humidity, temperature, battery in readings
+        ]).encode('utf-8'), 'application/json'
+    return '\n'.join(
+        f"soil,device_id={device} humidity={humidity},temperature={temperature},battery_charge={battery}i {ts}"
+        for device, ts, humidity, temperature, battery in readings
+    ).encode('utf-8'), 'text/plain'
+
+
+def ingest(args):
+    """POST reading batches to /api/readings concurrently and report readings per second.
+
+    Writes to the served database; run it against a generated one. The
+    readings are dated --days-ago days back so they do not collide with the
+    generated history, and every batch gets its own seconds.
+    """
+    base_url = args.url.rstrip('/')
+    device_ids, _ = discover(base_url, args.timeout)
+    name = f'ingest-{args.format}'
+    url = f"{base_url}/api/readings{'?precision=s' if args.format == 'line' else ''}"
+    print(f"Posting {args.batch}-reading {args.format} batches to {url} with {args.concurrency} workers "
+          f"for {args.duration}s ({len(device_ids)} sensors)")
+
+    span = math.ceil(args.batch / len(device_ids))
+    first_second = int(time.time()) - args.days_ago * 86400
+    samples, counts = [], {'inserted': 0, 'duplicates': 0, 'rejected': 0}
+    lock = threading.Lock()
+    start = time.perf_counter()
+    measure_from = start + args.warmup
+    stop_at = measure_from + args.duration
+
+    def worker(index):
+        rng = random.Random(args.seed + index)
+        sent = 0
+        while time.perf_counter() < stop_at:
+            slot = sent * args.concurrency + index
+            sent += 1
+            body, content_type = ingest_batch(device_ids, first_second + slot * span, args.batch, args.format, rng)
+            request_start = time.perf_counter()
+            try:
+                status, result = post(url, body, content_type, args.timeout)
+            except (urllib.error.URLError, socket.timeout, ConnectionError):
+                status, result = 599, None
+            elapsed_ms = (time.perf_counter() - request_start) * 1000
+            if request_start >= measure_from:
+                with lock:
+                    samples.append((elapsed_ms, status, len(body)))
+                    for key in counts:
+                        counts[key] += (result or {}).get(key, 0)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(worker, range(args.concurrency)))
+
+    result = summarize(samples, args.duration)
+    result.update(counts)
+    result['readings_per_s'] = round(counts['inserted'] / args.duration, 1)
+    print_report({name: result})
+    print(f"\n{counts['inserted']} readings inserted ({result['readings_per_s']}/s), "
+          f"{counts['duplicates']} duplicates, {counts['rejected']} rejected")
+
+    report = {
+        'label': args.label,
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(),
+        'url': base_url,
+        'duration_s': args.duration,
+        'warmup_s': args.warmup,
+        'concurrency': args.concurrency,
+        'batch': args.batch,
+        'host': socket.gethostname(),
+        'results': {name: result}
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+def compare(args):
+    """Print the change in latency and throughput between two result files"""
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    print(f"before: {before.get('label') or '-'} @ {before.get('commit') or '?'} ({before['timestamp']})")
+    print(f"after:  {after.get('label') or '-'} @ {after.get('commit') or '?'} ({after['timestamp']})\n")
+
+    def change(old, new):
+        if not old or new is None:
+            return '-'
+        return f"{(new - old) / old * 100:+.0f}%"
+
+    print(f"{'endpoint':<20}{'p50':>18}{'p95':>18}{'p99':>18}{'rps':>18}")
+    for name, new in after['results'].items():
+        old = before['results'].get(name)
+        if old is None:
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps'):
+            cells.append(f"{new[key] or 0:.1f} ({change(old[key], new[key])})")
+        print(f"{name:<20}" + ''.join(f"{cell:>18}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Garden API Benchmark')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    gen = subparsers.add_parser('generate', help='Build a synthetic database')
+    gen.add_argument('--output', default='bench/garden_sensors.db', help='Database file to create')
+    gen.add_argument('--layouts', type=int, default=3, help='Number of garden layouts')
+    gen.add_argument('--plants', type=int, default=40, help='Plants per layout')
+    gen.add_argument('--sensor-ratio', type=float, default=0.75, help='Fraction of plants with a sensor')
+    gen.add_argument('--readings', type=int, default=35000, help='Readings per sensor')
+    gen.add_argument('--interval', type=int, default=2400, help='Seconds between readings')
+    gen.add_argument('--photo-width', type=int, default=1600, help='Photo width in pixels')
+    gen.add_argument('--photo-height', type=int, default=1200, help='Photo height in pixels')
+    gen.add_argument('--photo-kb', type=int, default=400, help='Photo size without Pillow')
+    gen.add_argument('--seed', type=int, default=42)
+    gen.add_argument('--force', action='store_true', help='Overwrite an existing database')
+    gen.set_defaults(func=generate)
+
+    bench = subparsers.add_parser('run', help='Benchmark a running API server')
+    bench.add_argument('--url', default='http://127.0.0.1:5000', help='API server base URL')
+    bench.add_argument('--duration', type=float, default=30, help='Measured seconds')
+    bench.add_argument('--warmup', type=float, default=5, help='Unmeasured seconds before that')
+    bench.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+    bench.add_argument('--endpoints', nargs='+', help='Subset of endpoints to hit')
+    bench.add_argument('--export-days', type=int, default=30, help='Days of readings per CSV export')
+    bench.add_argument('--timeout', type=float, default=60, help='Per-request timeout in seconds')
+    bench.add_argument('--label', help='Name of this run, stored in the results')
+    bench.add_argument('--output', help='Write results as JSON to this file')
+    bench.add_argument('--seed', type=int, default=42)
+    bench.set_defaults(func=run)
+
+    load = subparsers.add_parser('ingest', help='Load-test POST /api/readings (writes to the database)')
+    load.add_argument('--url', default='http://127.0.0.1:5000', help='API server base URL')
+    load.add_argument('--duration', type=float, default=30, help='Measured seconds')
+    load.add_argument('--warmup', type=float, default=5, help='Unmeasured seconds before that')
+    load.add_argument('--concurrency', type=int, default=4, help='Concurrent clients')
+    load.add_argument('--batch', type=int, default=500, help='Readings per request')
+    load.add_argument('--format', choices=['json', 'line'], default='json', help='JSON or line protocol batches')
+    load.add_argument('--days-ago', type=int, default=3650, help='Date the readings this many days back')
+    load.add_argument('--timeout', type=float, default=60, help='Per-request timeout in seconds')
+    load.add_argument('--label', help='Name of this run, stored in the results')
+    load.add_argument('--output', help='Write results as JSON to this file')
+    load.add_argument('--seed', type=int, default=42)
+    load.set_defaults(func=ingest)
+
+    diff = subparsers.add_parser('compare', help='Compare two result files')
+    diff.add_argument('before')
+    diff.add_argument('after')
+    diff.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
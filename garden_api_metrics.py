@@ -0,0 +1,394 @@
+"""
+Garden API Metrics
+Request timing, SQL timing, slow-query log and on-demand profiling for
+garden_api_server.py. Results are collected in memory and exposed by the
+server at /api/admin/metrics.
+
+Settings are read from the [api] section of garden.ini:
+
+    [api]
+    instrument_sql = true       ; time every statement run on request connections
+    slow_query_ms = 100         ; log statements slower than this
+    profile = false             ; allow cProfile runs (X-Profile: 1 header)
+    profile_sample_rate = 0     ; also profile this fraction of all requests
+    slow_query_params = false   ; keep bound parameter values in the slow-query log
+    admin_token =               ; /api/admin/metrics from other hosts with this token
+
+The metrics endpoint answers loopback clients, and others only when they
+send the admin token (Authorization: Bearer <token>).
+"""
+
+import configparser
+import cProfile
+import hmac
+import ipaddress
+import io
+import pstats
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import request
+
+# Upper bounds (ms) of the latency histogram buckets
+LATENCY_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+SLOW_QUERY_HISTORY = 50
+PROFILE_HISTORY = 20
+PROFILE_TOP_FUNCTIONS = 25
+
+settings = {
+    'instrument_sql': True,
+    'slow_query_ms': 100.0,
+    'profile': False,
+    'profile_sample_rate': 0.0,
+    'slow_query_params': False,
+    'admin_token': ''
+}
+
+# Per-thread state of the request being handled
+_local = threading.local()
+
+
+def load_settings(config_file='garden.ini'):
+    """Read the [api] section of the config file into settings"""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    if not config.has_section('api'):
+        return
+    settings['instrument_sql'] = config.getboolean('api', 'instrument_sql', fallback=True)
+    settings['slow_query_ms'] = config.getfloat('api', 'slow_query_ms', fallback=100.0)
+    settings['profile'] = config.getboolean('api', 'profile', fallback=False)
+    settings['profile_sample_rate'] = config.getfloat('api', 'profile_sample_rate', fallback=0.0)
+    settings['slow_query_params'] = config.getboolean('api', 'slow_query_params', fallback=False)
+    settings['admin_token'] = config.get('api', 'admin_token', fallback='').strip()
+
+
+def admin_allowed(remote_addr, authorization):
+    """Whether a client may read or reset the metrics: the configured admin
+    token (an Authorization header value) or, without one, a loopback address"""
+    token = settings['admin_token']
+    if token and authorization:
+        scheme, _, value = authorization.partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(value.strip(), token):
+            return True
+    try:
+        return ipaddress.ip_address(remote_addr or '').is_loopback
+    except ValueError:
+        return False
+
+
+class Histogram:
+    """Fixed-bucket latency histogram with count, sum and max"""
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last bucket: above the largest bound
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (the max for the last bucket)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.bounds[index] if index < len(self.bounds) else round(self.max, 2)
+        return round(self.max, 2)
+
+    def to_dict(self):
+        buckets = {f'le_{bound}': count for bound, count in zip(self.bounds, self.counts)}
+        buckets['le_inf'] = self.counts[-1]
+        return buckets
+
+
+class RouteStats:
+    """Latency and SQL totals of one route"""
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.sql_ms = 0.0
+        self.sql_queries = 0
+
+    def to_dict(self):
+        count = self.latency.count
+        return {
+            'count': count,
+            'errors': self.errors,
+            'mean_ms': round(self.latency.total / count, 2) if count else None,
+            'max_ms': round(self.latency.max, 2),
+            'p50_ms': self.latency.percentile(0.5),
+            'p90_ms': self.latency.percentile(0.9),
+            'p99_ms': self.latency.percentile(0.99),
+            'sql_mean_ms': round(self.sql_ms / count, 2) if count else None,
+            'sql_queries_mean': round(self.sql_queries / count, 2) if count else None,
+            'histogram': self.latency.to_dict()
+        }
+
+
+_lock = threading.Lock()
+_routes = {}
+_slow_queries = deque(maxlen=SLOW_QUERY_HISTORY)
+_profiles = deque(maxlen=PROFILE_HISTORY)
+_started_at = datetime.now().isoformat()
+
+# cProfile can only run one profiler at a time on Python 3.12+
+_profiler_lock = threading.Lock()
+
+
+def _record_slow_query(cursor, elapsed_ms):
+    sql, parameters = cursor._statement
+    plan = None
+    try:
+        # A plain cursor, so the EXPLAIN itself is not instrumented
+        explain = sqlite3.Cursor(cursor.connection)
+        explain.execute('EXPLAIN QUERY PLAN ' + sql, parameters if parameters is not None else ())
+        plan = [row[3] for row in explain.fetchall()]
+    except sqlite3.Error:
+        pass
+    entry = {
+        'sql': ' '.join(sql.split()),
+        # Values can be personal data (device ids, notes), so only on request
+        'params': repr(parameters)[:500] if parameters is not None and settings['slow_query_params'] else None,
+        'ms': round(elapsed_ms, 2),
+        'route': getattr(_local, 'route', None),
+        'plan': plan,
+        'timestamp': datetime.now().isoformat()
+    }
+    with _lock:
+        _slow_queries.append(entry)
+    return entry
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times each statement, including fetching its rows"""
+
+    _statement = None
+    _elapsed_ms = 0.0
+    _slow_entry = None
+
+    def _start(self, sql, parameters):
+        self._statement = (sql, parameters)
+        self._elapsed_ms = 0.0
+        self._slow_entry = None
+
+    def _account(self, start):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._elapsed_ms += elapsed_ms
+        if getattr(_local, 'active', False):
+            _local.sql_ms += elapsed_ms
+        if self._slow_entry is not None:
+            self._slow_entry['ms'] = round(self._elapsed_ms, 2)
+        elif self._statement is not None and self._elapsed_ms >= settings['slow_query_ms']:
+            self._slow_entry = _record_slow_query(self, self._elapsed_ms)
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        if getattr(_local, 'active', False):
+            _local.sql_queries += 1
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._account(start)
+
+    def executemany(self, sql, seq_of_parameters):
+        # The parameter sets may be a one-shot iterator, so none are kept
+        self._start(sql, None)
+        if getattr(_local, 'active', False):
+            _local.sql_queries += 1
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._account(start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            self._account(start)
+
+    def fetchmany(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().fetchmany(*args, **kwargs)
+        finally:
+            self._account(start)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self._account(start)
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return super().__next__()
+        finally:
+            self._account(start)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors (including conn.execute) are InstrumentedCursors"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    """sqlite3.connect factory for request connections"""
+    return InstrumentedConnection if settings['instrument_sql'] else sqlite3.Connection
+
+
+def _before_request():
+    _local.active = True
+    _local.start = time.perf_counter()
+    _local.sql_ms = 0.0
+    _local.sql_queries = 0
+    _local.route = f"{request.method} {request.url_rule.rule if request.url_rule else '<unmatched>'}"
+    _local.profiler = None
+
+    wants_profile = request.headers.get('X-Profile') == '1' or (
+        settings['profile_sample_rate'] > 0 and random.random() < settings['profile_sample_rate']
+    )
+    if settings['profile'] and wants_profile and _profiler_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiling tool is active
+            _profiler_lock.release()
+        else:
+            _local.profiler = profiler
+
+
+def _after_request(response):
+    if not getattr(_local, 'active', False):
+        return response
+    _local.active = False
+    elapsed_ms = (time.perf_counter() - _local.start) * 1000
+
+    _finish_profile(elapsed_ms)
+    record_request(_local.route, elapsed_ms, response.status_code, _local.sql_ms, _local.sql_queries)
+    response.headers['Server-Timing'] = f"app;dur={elapsed_ms:.1f}, db;dur={_local.sql_ms:.1f}"
+    return response
+
+
+def _teardown_request(exc):
+    # Flask skips after_request when the view raises; this always runs
+    if getattr(_local, 'profiler', None) is not None:
+        _finish_profile((time.perf_counter() - _local.start) * 1000)
+    _local.active = False
+
+
+def _finish_profile(elapsed_ms):
+    """Stop this request's profiler, if any, release it and keep its stats"""
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is None:
+        return
+    _local.profiler = None
+    try:
+        profiler.disable()
+    finally:
+        _profiler_lock.release()
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+    with _lock:
+        _profiles.append({
+            'route': _local.route,
+            'path': request.full_path,
+            'ms': round(elapsed_ms, 2),
+            'timestamp': datetime.now().isoformat(),
+            'stats': output.getvalue()
+        })
+
+
+def record_request(route, elapsed_ms, status_code, sql_ms=0.0, sql_queries=0):
+    """Add one handled request to the per-route statistics"""
+    with _lock:
+        stats = _routes.get(route)
+        if stats is None:
+            stats = _routes[route] = RouteStats()
+        stats.latency.add(elapsed_ms)
+        stats.sql_ms += sql_ms
+        stats.sql_queries += sql_queries
+        if status_code >= 500:
+            stats.errors += 1
+
+
+def start_sql_timing(route=None):
+    """Start counting SQL time on this thread outside a Flask request"""
+    _local.active = True
+    _local.sql_ms = 0.0
+    _local.sql_queries = 0
+    _local.route = route
+
+
+def stop_sql_timing():
+    """Stop counting SQL time on this thread; returns (sql_ms, sql_queries)"""
+    _local.active = False
+    return _local.sql_ms, _local.sql_queries
+
+
+def init_app(app, config_file='garden.ini'):
+    """Register the timing hooks on a Flask app.
+
+    Call this before registering other after_request hooks: Flask runs them
+    in reverse order, so the timing then covers them (e.g. compression).
+    Streamed responses are timed up to the start of the stream.
+    """
+    load_settings(config_file)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+def snapshot():
+    """Everything collected since the server started (or the last reset)"""
+    with _lock:
+        routes = {route: stats.to_dict() for route, stats in sorted(_routes.items())}
+        slow_queries = list(_slow_queries)
+        profiles = list(_profiles)
+    return {
+        'started_at': _started_at,
+        'settings': dict(settings),
+        'routes': routes,
+        'slow_queries': slow_queries[::-1],
+        'profiles': profiles[::-1]
+    }
+
+
+def reset():
+    """Clear collected metrics"""
+    global _started_at
+    with _lock:
+        _routes.clear()
+        _slow_queries.clear()
+        _profiles.clear()
+        _started_at = datetime.now().isoformat()
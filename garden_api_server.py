@@ -1,35 +1,205 @@
-from flask import Flask, jsonify, request, send_file, Response, send_from_directory, make_response
+from flask import Flask, jsonify, request, send_file, Response, send_from_directory, make_response, stream_with_context
 from flask_cors import CORS
+from werkzeug.http import is_resource_modified
 import sqlite3
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import csv
 import io
 import os
+import sys
 import threading
 import subprocess
+import hashlib
+import zlib
+import base64
+import gzip
+import calendar
+import time
+from collections import deque, OrderedDict
+from garden_db_schema import ensure_schema, table_exists, BUCKET_SQL, ROLLUP_TABLES, ROLLUP_SELECT
+from garden_analytics import lttb_indices
+from garden_db_writer import photo_hash, insert_new_readings
+from garden_ingest import (
+    known_devices, parse_json_batch, parse_line_protocol, validate_readings,
+    INGEST_MAX_READINGS, INGEST_MAX_ERRORS
+)
+from garden_thresholds import ThresholdResolver
+from garden_series_format import (
+    negotiate_series_format, group_readings, encode_response_body,
+    SERIES_MIMETYPE, MSGPACK_MIMETYPE, JSON_MIMETYPE
+)
+import garden_api_metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+CORS(app, expose_headers=['X-Next-Cursor', 'Server-Timing'])  # Enable CORS for all routes
+# Registered first so its after_request hook times the others too
+garden_api_metrics.init_app(app)
 
 DB_FILE = 'garden_sensors.db'
 
+_schema_checked = False
+_schema_lock = threading.Lock()
+
 def get_db_connection():
     """Create a database connection"""
-    conn = sqlite3.connect(DB_FILE)
+    global _schema_checked
+    conn = sqlite3.connect(DB_FILE, factory=garden_api_metrics.connection_factory())
     conn.row_factory = sqlite3.Row  # This enables column access by name
+    if not _schema_checked:
+        with _schema_lock:
+            if not _schema_checked:
+                ensure_schema(conn)
+                _schema_checked = True
     return conn
 
+# Long-lived connection used only to read PRAGMA data_version, which changes
+# whenever another connection (the logger, the db manager or one of our own
+# request connections) commits to the database file.
+_version_conn = None
+_version_lock = threading.Lock()
+
+def get_data_version():
+    """Get the database change counter"""
+    global _version_conn
+    with _version_lock:
+        if _version_conn is None:
+            _version_conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+        return _version_conn.execute('PRAGMA data_version').fetchone()[0]
+
+# Response compression: negotiated per request, brotli when available
+COMPRESS_MIN_SIZE = 1024
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'text/html', 'text/css', 'text/csv',
+    'text/plain', 'application/javascript', 'image/svg+xml',
+    SERIES_MIMETYPE, MSGPACK_MIMETYPE
+}
+_compression_stats = {'responses': 0, 'bytes_in': 0, 'bytes_out': 0}
+_compression_stats_lock = threading.Lock()
+
+# Precompressed static files: (path, mtime, encoding) -> bytes
+_static_cache = {}
+
+def negotiate_encoding(accept_encodings=None):
+    """Pick the best content encoding the client accepts, or None"""
+    if accept_encodings is None:
+        accept_encodings = request.accept_encodings
+    encodings = ['br', 'gzip'] if brotli else ['gzip']
+    encoding = accept_encodings.best_match(encodings)
+    if encoding and accept_encodings[encoding]:
+        return encoding
+    return None
+
+def compress_data(data, encoding, static=False):
+    """Compress bytes with gzip or brotli; static content uses the highest level"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if static else 5)
+    return gzip.compress(data, compresslevel=9 if static else 6)
+
+def record_compression(size_in, size_out):
+    with _compression_stats_lock:
+        _compression_stats['responses'] += 1
+        _compression_stats['bytes_in'] += size_in
+        _compression_stats['bytes_out'] += size_out
+
+def send_static_file(filename, mimetype=None):
+    """Send a file, precompressed once per modification time when compressible"""
+    response = send_file(filename, mimetype=mimetype)
+    encoding = negotiate_encoding()
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or not encoding:
+        return response
+    
+    mtime = os.stat(filename).st_mtime
+    key = (filename, mtime, encoding)
+    if key not in _static_cache:
+        with open(filename, 'rb') as f:
+            raw = f.read()
+        # Drop entries for older versions of the file
+        for old_key in [k for k in _static_cache if k[0] == filename and k[1] != mtime]:
+            del _static_cache[old_key]
+        _static_cache[key] = (compress_data(raw, encoding, static=True), len(raw))
+    data, raw_size = _static_cache[key]
+    record_compression(raw_size, len(data))
+    
+    compressed = Response(data, mimetype=response.mimetype)
+    compressed.headers['Content-Encoding'] = encoding
+    compressed.headers['Vary'] = 'Accept-Encoding'
+    compressed.last_modified = response.last_modified
+    etag, _ = response.get_etag()
+    if etag:
+        compressed.set_etag(f'{etag}-{encoding}')
+    response.close()
+    return compressed.make_conditional(request)
+
+@app.after_request
+def compress_response(response):
+    """Compress dynamic responses (JSON, HTML, CSV) above a minimum size"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    encoding = negotiate_encoding()
+    if not encoding:
+        response.vary.add('Accept-Encoding')
+        return response
+    
+    compressed = compress_data(data, encoding)
+    record_compression(len(data), len(compressed))
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # The compressed body is a different representation of the same
+    # content: keep revalidation working but drop the byte-exact guarantee
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+@app.route('/api/compression-stats', methods=['GET'])
+def get_compression_stats():
+    """Bytes before and after compression since the server started"""
+    with _compression_stats_lock:
+        stats = dict(_compression_stats)
+    stats['saved_bytes'] = stats['bytes_in'] - stats['bytes_out']
+    stats['ratio'] = round(stats['bytes_out'] / stats['bytes_in'], 3) if stats['bytes_in'] else None
+    stats['brotli_available'] = brotli is not None
+    return jsonify(stats)
+
+@app.route('/api/admin/metrics', methods=['GET', 'DELETE'])
+def admin_metrics():
+    """Per-route latency, SQL time, slow queries and profiles; DELETE resets them.
+
+    Only for loopback clients, or with the [api] admin_token as a bearer token.
+    """
+    if not garden_api_metrics.admin_allowed(request.remote_addr, request.headers.get('Authorization')):
+        return jsonify({'error': 'Forbidden'}), 403
+    if request.method == 'DELETE':
+        garden_api_metrics.reset()
+        return jsonify({'status': 'reset'})
+    metrics = garden_api_metrics.snapshot()
+    metrics['compression'] = get_compression_stats().get_json()
+    return jsonify(metrics)
+
 @app.route('/')
 def index():
     """Serve the main HTML page"""
-    return send_file('garden_web_interface.html')
+    return send_static_file('garden_web_interface.html')
 
 @app.route('/garden_data.json')
 def get_garden_data():
     """Serve garden layout data"""
     if os.path.exists('garden_data.json'):
-        return send_file('garden_data.json')
+        return send_static_file('garden_data.json')
     else:
         return jsonify({'error': 'Garden data file not found'}), 404
 
@@ -47,10 +217,16 @@ def serve_static(filename):
         
         # Handle conditional requests
         if_none_match = request.headers.get('If-None-Match')
-        if if_none_match == etag:
+        if if_none_match in (etag, f'W/{etag}'):
             return Response(status=304)  # Not Modified
         
-        response = make_response(send_from_directory('.', filename))
+        # Images are already compressed; JSON is precompressed once
+        if filename.endswith('.json'):
+            response = make_response(send_static_file(filename))
+            if response.status_code == 304:
+                return response
+        else:
+            response = make_response(send_from_directory('.', filename))
         
         # Set caching headers based on file type
         if filename.endswith(('.png', '.jpg', '.jpeg', '.gif')):
@@ -62,8 +238,8 @@ def serve_static(filename):
             response.headers['Cache-Control'] = 'public, max-age=3600'
             response.headers['Expires'] = (datetime.now() + timedelta(hours=1)).strftime('%a, %d %b %Y %H:%M:%S GMT')
         
-        # Set ETag and Last-Modified
-        response.headers['ETag'] = etag
+        # Set ETag and Last-Modified (weak for a compressed representation)
+        response.headers['ETag'] = f'W/{etag}' if 'Content-Encoding' in response.headers else etag
         response.headers['Last-Modified'] = datetime.fromtimestamp(file_mtime).strftime('%a, %d %b %Y %H:%M:%S GMT')
         
         return response
@@ -83,175 +259,501 @@ def health_check():
     except Exception as e:
         return jsonify({'status': 'unhealthy', 'error': str(e)}), 500
 
-@app.route('/api/trigger-sensor-poll', methods=['POST'])
-def trigger_sensor_poll():
-    """Trigger immediate sensor polling"""
+# Files shared with garden_db_logger.py for on-demand polls
+LOGGER_PID_FILE = 'garden_db_logger.pid'
+POLL_TRIGGER_FILE = 'poll_trigger.txt'
+POLL_TRIGGER_DONE_FILE = 'poll_trigger_done.txt'
+POLL_TIMEOUT = 60
+
+def logger_pid():
+    """PID of the running continuous logger, from its pidfile, or None"""
+    try:
+        with open(LOGGER_PID_FILE, 'r') as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+    
     try:
-        # Try to create a trigger file that the logger can detect
-        trigger_file = 'poll_trigger.txt'
-        with open(trigger_file, 'w') as f:
-            f.write(str(datetime.now().timestamp()))
-        
-        # Also try to run a single poll if logger is not running
-        # Check if we can run it without interfering with existing process
         import psutil
-        import sys
+    except ImportError:
+        if os.name == 'nt':
+            # Without psutil there is no safe liveness check on Windows
+            return pid
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return None
+        except PermissionError:
+            pass
+        return pid
+    
+    try:
+        # Guard against a stale pidfile whose PID was reused
+        cmdline = psutil.Process(pid).cmdline()
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return None
+    if not any('garden_db_logger.py' in part for part in cmdline):
+        return None
+    return pid
+
+def total_readings():
+    """Current value of the total_readings counter"""
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT value FROM sensor_stats WHERE name = 'total_readings'").fetchone()
+        return row['value'] if row else 0
+    finally:
+        conn.close()
+
+class JobQueue:
+    """Background jobs with status lookup by ID.
+    
+    Submitting a job of a kind that is already queued or running returns
+    the existing job instead of starting another, so concurrent requests
+    share one run. Finished jobs are kept for lookup until `history`
+    newer jobs have been submitted.
+    """
+    
+    def __init__(self, history=50):
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._active = {}
+        self._history = history
+    
+    def submit(self, kind, func):
+        """Start func(job) in a worker thread unless a `kind` job is active"""
+        with self._lock:
+            job_id = self._active.get(kind)
+            if job_id is not None:
+                return dict(self._jobs[job_id], coalesced=True)
+            
+            job_id = base64.urlsafe_b64encode(os.urandom(9)).decode('ascii')
+            job = {
+                'id': job_id,
+                'type': kind,
+                'status': 'queued',
+                'created_at': datetime.now().isoformat(),
+                'started_at': None,
+                'finished_at': None,
+                'result': None,
+                'error': None
+            }
+            self._jobs[job_id] = job
+            self._active[kind] = job_id
+            while len(self._jobs) > self._history:
+                oldest = next(iter(self._jobs))
+                if oldest in self._active.values():
+                    break
+                self._jobs.popitem(last=False)
+            snapshot = dict(job, coalesced=False)
         
-        # Check if garden_db_logger.py is already running
-        logger_running = False
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+        threading.Thread(target=self._run, args=(job, func), daemon=True).start()
+        return snapshot
+    
+    def _run(self, job, func):
+        self._update(job, status='running', started_at=datetime.now().isoformat())
+        try:
+            result = func()
+            self._update(job, status='succeeded', result=result)
+        except Exception as e:
+            self._update(job, status='failed', error=str(e))
+        finally:
+            with self._lock:
+                job['finished_at'] = datetime.now().isoformat()
+                self._active.pop(job['type'], None)
+    
+    def _update(self, job, **fields):
+        with self._lock:
+            job.update(fields)
+    
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+job_queue = JobQueue()
+
+def run_sensor_poll():
+    """Poll all sensors once, through the running logger if there is one"""
+    readings_before = total_readings()
+    
+    pid = logger_pid()
+    if pid is not None:
+        # Ask the logger for an immediate poll and wait until it reports
+        # having answered this trigger
+        trigger_time = datetime.now().timestamp()
+        with open(POLL_TRIGGER_FILE, 'w') as f:
+            f.write(str(trigger_time))
+        
+        deadline = time.monotonic() + POLL_TIMEOUT
+        while True:
             try:
-                cmdline = proc.info.get('cmdline', [])
-                if cmdline and 'garden_db_logger.py' in ' '.join(cmdline):
-                    logger_running = True
-                    break
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                with open(POLL_TRIGGER_DONE_FILE, 'r') as f:
+                    if float(f.read().strip()) >= trigger_time:
+                        break
+            except (OSError, ValueError):
                 pass
-        
-        if not logger_running:
-            # Logger not running, we can run single poll
-            python_exe = sys.executable
+            if time.monotonic() > deadline:
+                raise RuntimeError('Sensor polling timeout')
+            time.sleep(0.5)
+        mode = 'logger'
+        message = 'Sensor poll triggered'
+    else:
+        # Logger not running, we can run single poll
+        try:
             result = subprocess.run(
-                [python_exe, 'garden_db_logger.py', '--single-poll'],
+                [sys.executable, 'garden_db_logger.py', '--single-poll'],
                 capture_output=True,
                 text=True,
-                timeout=60
+                timeout=POLL_TIMEOUT
             )
-            
-            if result.returncode == 0:
-                return jsonify({
-                    'status': 'success',
-                    'message': 'Sensor polling completed (single poll)',
-                    'timestamp': datetime.now().isoformat()
-                }), 200
-            else:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Sensor polling failed',
-                    'error': result.stderr,
-                    'timestamp': datetime.now().isoformat()
-                }), 500
-        else:
-            # Logger is running, trigger file created
-            return jsonify({
-                'status': 'success',
-                'message': 'Sensor poll triggered',
-                'timestamp': datetime.now().isoformat()
-            }), 200
-            
-    except subprocess.TimeoutExpired:
-        return jsonify({
-            'status': 'error',
-            'message': 'Sensor polling timeout',
-            'timestamp': datetime.now().isoformat()
-        }), 500
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e),
-            'timestamp': datetime.now().isoformat()
-        }), 500
+        except subprocess.TimeoutExpired:
+            raise RuntimeError('Sensor polling timeout')
+        if result.returncode != 0:
+            raise RuntimeError(f"Sensor polling failed: {result.stderr}")
+        mode = 'single_poll'
+        message = 'Sensor polling completed (single poll)'
+    
+    return {
+        'mode': mode,
+        'message': message,
+        'readings_added': total_readings() - readings_before,
+        'timestamp': datetime.now().isoformat()
+    }
 
-@app.route('/api/sensor-data', methods=['GET'])
-def get_sensor_data():
-    """API endpoint to retrieve sensor data"""
+@app.route('/api/trigger-sensor-poll', methods=['POST'])
+def trigger_sensor_poll():
+    """Queue an immediate sensor poll; returns the job to follow at /api/jobs/<id>"""
+    job = job_queue.submit('sensor_poll', run_sensor_poll)
+    response = jsonify({
+        'status': 'accepted',
+        'job_id': job['id'],
+        'job': job,
+        'timestamp': datetime.now().isoformat()
+    })
+    response.status_code = 202
+    response.headers['Location'] = f"/api/jobs/{job['id']}"
+    return response
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """API endpoint to get the status and result of a background job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+# Ingest requests queue here rather than in SQLite's busy handler, which
+# sleeps between retries
+_ingest_lock = threading.Lock()
+
+def is_busy_error(error):
+    """Whether a sqlite3.OperationalError is a lock timeout, worth retrying.
+
+    SQLITE_BUSY reads "database is locked", SQLITE_LOCKED "database table
+    (or schema) is locked".
+    """
+    return str(error).startswith('database') and str(error).endswith('is locked')
+
+@app.route('/api/readings', methods=['POST'])
+def ingest_readings():
+    """Store a batch of readings from sensors the logger does not poll.
+
+    The body is JSON, or InfluxDB line protocol with any other content type
+    (precision: s, ms, us or ns, the default); see garden_ingest.py.
+    Readings already stored for the same device, date and time are skipped,
+    so a batch can be retried safely. Returns the number of inserted,
+    duplicate and rejected readings, with the first errors.
+    """
+    body = request.get_data(as_text=True)
+    try:
+        if request.is_json:
+            readings = parse_json_batch(body)
+            positions, errors = None, []
+        else:
+            readings, positions, errors = parse_line_protocol(body, request.args.get('precision', 'ns'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    received = len(readings) + len(errors)
+    if received > INGEST_MAX_READINGS:
+        return jsonify({'error': f'At most {INGEST_MAX_READINGS} readings per request'}), 413
+    
     conn = get_db_connection()
-    cursor = conn.cursor()
+    try:
+        valid, invalid = validate_readings(readings, known_devices(conn), positions)
+        errors.extend(invalid)
+        with _ingest_lock:
+            # Holds the write lock from the duplicate check to the commit
+            conn.execute('BEGIN IMMEDIATE')
+            inserted = insert_new_readings(conn, valid)
+            conn.commit()
+    except sqlite3.OperationalError as e:
+        conn.rollback()
+        if not is_busy_error(e):
+            # Schema and disk errors do not go away on a retry
+            print(f"Error storing readings: {e}")
+            return jsonify({'error': str(e)}), 500
+        response = jsonify({'error': f'Database busy, retry later: {e}'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+    finally:
+        conn.close()
     
-    # Get query parameters
-    plant_id = request.args.get('plant')
-    device_id = request.args.get('device_id')
-    date_from = request.args.get('dateFrom')
-    date_to = request.args.get('dateTo')
-    limit = request.args.get('limit', 1000, type=int)
+    position = 'index' if positions is None else 'line'
+    response = jsonify({
+        'received': received,
+        'inserted': len(inserted),
+        'duplicates': len(valid) - len(inserted),
+        'rejected': len(errors),
+        'errors': [{position: p, 'error': message} for p, message in sorted(errors)[:INGEST_MAX_ERRORS]]
+    })
+    # A batch with nothing usable in it is the client's mistake
+    if errors and not valid:
+        response.status_code = 400
+    return response
+
+def reading_to_dict(row):
+    """Convert a sensor_readings row to its JSON representation"""
+    return {
+        'id': row['id'],
+        'plant_unique_id': row['plant_unique_id'],
+        'sensor_name': row['sensor_name'],
+        'device_id': row['device_id'],
+        'date': row['date'],
+        'time': row['time'],
+        'temperature': row['temperature'],
+        'humidity': row['humidity'],
+        'battery_charge': row['battery_charge'],
+        'sensor_state': row['sensor_state'],
+        'timestamp': row['timestamp']
+    }
+
+def encode_cursor(*parts):
+    """Encode a pagination position as an opaque URL-safe token"""
+    raw = json.dumps(parts, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """Decode a token produced by encode_cursor, raising ValueError if invalid.
+
+    The parts are a mode string followed by position values, which are
+    bound as SQL parameters, so only integers and strings are accepted.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        parts = json.loads(raw)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(parts, list) or not parts or not isinstance(parts[0], str):
+        raise ValueError('Invalid cursor')
+    if not all(isinstance(part, (int, str)) and not isinstance(part, bool) for part in parts[1:]):
+        raise ValueError('Invalid cursor')
+    return parts
+
+def int_arg(args, name, default):
+    """Integer query parameter, or default when missing or malformed"""
+    try:
+        return int(args.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+def sensor_data_page(conn, args):
+    """One page of readings for /api/sensor-data as (readings, next_cursor).
+
+    Raises ValueError for an invalid cursor.
+    """
+    limit = int_arg(args, 'limit', 1000)
+    cursor_token = args.get('cursor')
+    since = args.get('since')
     
     # Build query
-    query = "SELECT * FROM sensor_readings WHERE 1=1"
-    params = []
+    where, params = build_reading_filters(args)
     
-    if plant_id:
-        query += " AND plant_unique_id = ?"
-        params.append(plant_id)
-    
-    if device_id:
-        query += " AND device_id = ?"
-        params.append(device_id)
-    
-    if date_from:
-        query += " AND date >= ?"
-        params.append(date_from)
+    if cursor_token:
+        mode, *position = decode_cursor(cursor_token)
+    elif since and since.isdigit():
+        mode, position = 'id', [int(since)]
+    elif since:
+        mode, position = 'asc', None
+        where += " AND timestamp > ?"
+        params.append(since)
+    else:
+        mode, position = 'desc', None
     
-    if date_to:
-        query += " AND date <= ?"
-        params.append(date_to)
+    if mode == 'id':
+        if len(position) != 1 or not isinstance(position[0], int):
+            raise ValueError('Invalid cursor')
+        where += " AND id > ?"
+        order = "id ASC"
+    elif mode in ('asc', 'desc'):
+        if position is not None and (len(position) != 2 or not isinstance(position[1], int)):
+            raise ValueError('Invalid cursor')
+        if position:
+            where += " AND (timestamp, id) > (?, ?)" if mode == 'asc' else " AND (timestamp, id) < (?, ?)"
+        order = "timestamp ASC, id ASC" if mode == 'asc' else "timestamp DESC, id DESC"
+    else:
+        raise ValueError('Invalid cursor')
     
-    query += " ORDER BY date DESC, time DESC LIMIT ?"
+    params.extend(position or [])
     params.append(limit)
     
     # Execute query
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
+    rows = conn.execute(f"SELECT * FROM sensor_readings {where} ORDER BY {order} LIMIT ?", params).fetchall()
     
-    # Convert to list of dictionaries
-    data = []
-    for row in rows:
-        data.append({
-            'id': row['id'],
-            'plant_unique_id': row['plant_unique_id'],
-            'sensor_name': row['sensor_name'],
-            'device_id': row['device_id'],
-            'date': row['date'],
-            'time': row['time'],
-            'temperature': row['temperature'],
-            'humidity': row['humidity'],
-            'battery_charge': row['battery_charge'],
-            'sensor_state': row['sensor_state'],
-            'timestamp': row['timestamp']
-        })
+    next_cursor = None
+    if rows and len(rows) == limit:
+        last = rows[-1]
+        if mode == 'id':
+            next_cursor = encode_cursor('id', last['id'])
+        else:
+            next_cursor = encode_cursor(mode, last['timestamp'], last['id'])
+    return [reading_to_dict(row) for row in rows], next_cursor
+
+@app.route('/api/sensor-data', methods=['GET'])
+def get_sensor_data():
+    """API endpoint to retrieve sensor data.
+
+    Results are ordered newest first by (timestamp, id). When a page is
+    full, the X-Next-Cursor header holds a token for the next page.
+    Query parameters, besides the usual filters:
+    - cursor: token from a previous X-Next-Cursor header
+    - since: only readings newer than this reading id or timestamp,
+      returned oldest first
+    - points: downsample the range to about this many points for charts
+      (see downsampled_sensor_data)
     
-    conn.close()
-    return jsonify(data)
+    Send Accept: application/x-garden-series (or application/x-msgpack)
+    for the readings grouped per device as compact columns, see
+    garden_series_format.py.
+    """
+    mimetype = negotiate_series_format(request.accept_mimetypes)
+    points = request.args.get('points', type=int)
+    if points:
+        try:
+            body = downsampled_sensor_data(request.args, points, mimetype=mimetype)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return series_response(body, mimetype)
+    
+    conn = get_db_connection()
+    try:
+        data, next_cursor = sensor_data_page(conn, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        conn.close()
+    
+    if mimetype == JSON_MIMETYPE:
+        response = series_response(json.dumps(data, separators=(',', ':')), mimetype)
+    else:
+        response = series_response(
+            encode_response_body(mimetype, group_readings(data), next_cursor=next_cursor), mimetype
+        )
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+def series_response(body, mimetype):
+    """Response for a body in a negotiated series format"""
+    response = Response(body, mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+# Downsampled series, keyed by (filters, points, metric, mimetype, data_version)
+_downsample_cache = OrderedDict()
+_downsample_cache_lock = threading.Lock()
+DOWNSAMPLE_CACHE_SIZE = 64
+
+def downsampled_sensor_data(args, points, conn=None, mimetype=JSON_MIMETYPE):
+    """Return a device's readings downsampled with LTTB as a body in
+    mimetype (JSON or a garden_series_format encoding), oldest first.
+
+    The whole range selected by the filters is fetched and reduced to about
+    `points` readings chosen to preserve the shape of the `metric` series
+    (humidity by default). Results are cached until the database changes.
+    Raises ValueError for a missing device_id or unknown metric.
+    """
+    device_id = args.get('device_id')
+    metric = args.get('metric', 'humidity')
+    if not device_id:
+        raise ValueError('points requires device_id')
+    if metric not in ('humidity', 'temperature'):
+        raise ValueError('metric must be humidity or temperature')
+    
+    key = (
+        device_id, args.get('plant'), args.get('dateFrom'),
+        args.get('dateTo'), points, metric, mimetype, get_data_version()
+    )
+    with _downsample_cache_lock:
+        body = _downsample_cache.get(key)
+        if body is not None:
+            _downsample_cache.move_to_end(key)
+    
+    if body is None:
+        where, params = build_reading_filters(args)
+        own_conn = conn is None
+        if own_conn:
+            conn = get_db_connection()
+        try:
+            rows = conn.execute(f'''
+                SELECT *, CAST(strftime('%s', timestamp) AS INTEGER) as epoch
+                FROM sensor_readings {where} AND {metric} IS NOT NULL
+                ORDER BY timestamp ASC, id ASC
+            ''', params).fetchall()
+        finally:
+            if own_conn:
+                conn.close()
+        
+        selected = lttb_indices([row['epoch'] for row in rows], [row[metric] for row in rows], points)
+        data = [reading_to_dict(rows[i]) for i in selected]
+        if mimetype == JSON_MIMETYPE:
+            body = json.dumps(data, separators=(',', ':'))
+        else:
+            body = encode_response_body(mimetype, {device_id: data})
+        
+        with _downsample_cache_lock:
+            _downsample_cache[key] = body
+            while len(_downsample_cache) > DOWNSAMPLE_CACHE_SIZE:
+                _downsample_cache.popitem(last=False)
+    
+    return body
 
 @app.route('/api/sensor-stats', methods=['GET'])
 def get_sensor_stats():
-    """API endpoint to get sensor statistics"""
+    """API endpoint to get sensor statistics from the incrementally kept counters"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Get total readings
-    cursor.execute("SELECT COUNT(*) as total FROM sensor_readings")
-    total_readings = cursor.fetchone()['total']
+    # Readings are stored with the logger's local date
+    today = datetime.now().strftime('%Y-%m-%d')
     
-    # Get active sensors count
-    cursor.execute("""
-        SELECT COUNT(DISTINCT sensor_name) as active_sensors 
-        FROM sensor_readings 
-        WHERE sensor_state = 1 
-        AND date = date('now')
-    """)
-    active_sensors = cursor.fetchone()['active_sensors']
+    # Get total readings
+    cursor.execute("SELECT value FROM sensor_stats WHERE name = 'total_readings'")
+    row = cursor.fetchone()
+    total_readings = row['value'] if row else 0
     
-    # Get average temperature and humidity for today
+    # Get active sensors count and average temperature and humidity for today
     cursor.execute("""
         SELECT 
-            AVG(temperature) as avg_temp,
-            AVG(humidity) as avg_humidity
-        FROM sensor_readings 
-        WHERE sensor_state = 1 
-        AND date = date('now')
-    """)
+            COUNT(*) as active_sensors,
+            SUM(temperature_sum) / SUM(temperature_count) as avg_temp,
+            SUM(humidity_sum) / SUM(humidity_count) as avg_humidity
+        FROM sensor_daily_stats
+        WHERE date = ? AND active_readings > 0
+    """, (today,))
     row = cursor.fetchone()
+    active_sensors = row['active_sensors']
     avg_temp = row['avg_temp']
     avg_humidity = row['avg_humidity']
     
     # Get sensors with low battery
     cursor.execute("""
-        SELECT DISTINCT sensor_name, battery_charge
-        FROM sensor_readings 
-        WHERE battery_charge < 20
-        AND date = date('now')
+        SELECT sensor_name, battery_charge
+        FROM sensor_low_battery
+        WHERE date = ?
         ORDER BY battery_charge ASC
-    """)
+    """, (today,))
     low_battery_sensors = []
     for row in cursor.fetchall():
         low_battery_sensors.append({
@@ -269,25 +771,24 @@ def get_sensor_stats():
         'low_battery_sensors': low_battery_sensors
     })
 
-@app.route('/api/export-csv', methods=['GET'])
-def export_csv():
-    """Export sensor data as CSV"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get query parameters (same as sensor-data endpoint)
-    plant_id = request.args.get('plant')
-    date_from = request.args.get('dateFrom')
-    date_to = request.args.get('dateTo')
-    
-    # Build query
-    query = "SELECT * FROM sensor_readings WHERE 1=1"
+def build_reading_filters(args):
+    """Build the WHERE clause shared by the reading query and export endpoints"""
+    query = "WHERE 1=1"
     params = []
     
+    plant_id = args.get('plant')
+    device_id = args.get('device_id')
+    date_from = args.get('dateFrom')
+    date_to = args.get('dateTo')
+    
     if plant_id:
         query += " AND plant_unique_id = ?"
         params.append(plant_id)
     
+    if device_id:
+        query += " AND device_id = ?"
+        params.append(device_id)
+    
     if date_from:
         query += " AND date >= ?"
         params.append(date_from)
@@ -296,49 +797,566 @@ def export_csv():
         query += " AND date <= ?"
         params.append(date_to)
     
-    query += " ORDER BY date DESC, time DESC"
-    
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
+    return query, params
+
+EXPORT_CHUNK_SIZE = 2000
+
+def fetch_reading_chunk(conn, where, params, last_id, columns='*', chunk_size=EXPORT_CHUNK_SIZE):
+    """Rows after last_id in id order, at most chunk_size of them"""
+    return conn.execute(
+        f"SELECT {columns} FROM sensor_readings {where} AND id > ? ORDER BY id LIMIT ?",
+        params + [last_id, chunk_size]
+    ).fetchall()
+
+def iter_reading_chunks(where, params, since_id=0, columns='*', chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of sensor_readings rows in id order, one short query per chunk.
     
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
+    Each chunk is a separate keyset query (``id > last_id``), so memory stays
+    constant and no read lock is held between chunks while the logger writes.
+    """
+    conn = get_db_connection()
+    try:
+        last_id = since_id
+        while True:
+            rows = fetch_reading_chunk(conn, where, params, last_id, columns, chunk_size)
+            if not rows:
+                break
+            yield rows
+            last_id = rows[-1]['id']
+            if len(rows) < chunk_size:
+                break
+    finally:
+        conn.close()
+
+class CsvExportWriter:
+    """Encodes reading rows as CSV bytes, optionally as one gzip stream"""
     
-    # Write header
-    writer.writerow([
+    HEADER = [
         'Plant ID', 'Sensor Name', 'Device ID', 'Date', 'Time',
-        'Temperature (°C)', 'Humidity (%)', 'Battery (%)', 
-        'Sensor State', 'Timestamp'
-    ])
+        'Temperature (°C)', 'Humidity (%)', 'Battery (%)',
+        'Sensor State', 'Timestamp', 'Reading ID'
+    ]
     
-    # Write data
-    for row in rows:
-        writer.writerow([
-            row['plant_unique_id'],
-            row['sensor_name'],
-            row['device_id'],
-            row['date'],
-            row['time'],
-            row['temperature'],
-            row['humidity'],
-            row['battery_charge'],
-            'Active' if row['sensor_state'] == 1 else 'Inactive',
-            row['timestamp']
+    def __init__(self, use_gzip=False):
+        self.output = io.StringIO()
+        self.writer = csv.writer(self.output)
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if use_gzip else None
+    
+    def _flush(self):
+        data = self.output.getvalue().encode('utf-8')
+        self.output.seek(0)
+        self.output.truncate()
+        return self.compressor.compress(data) if self.compressor else data
+    
+    def header(self):
+        self.writer.writerow(self.HEADER)
+        return self._flush()
+    
+    def rows(self, rows):
+        for row in rows:
+            self.writer.writerow([
+                row['plant_unique_id'],
+                row['sensor_name'],
+                row['device_id'],
+                row['date'],
+                row['time'],
+                row['temperature'],
+                row['humidity'],
+                row['battery_charge'],
+                'Active' if row['sensor_state'] == 1 else 'Inactive',
+                row['timestamp'],
+                row['id']
+            ])
+        return self._flush()
+    
+    def finish(self):
+        return self.compressor.flush() if self.compressor else b''
+
+def csv_export_options(args):
+    """(where, params, since_id, use_gzip, filename) of an /api/export-csv request"""
+    where, params = build_reading_filters(args)
+    since_id = int_arg(args, 'since_id', 0)
+    use_gzip = args.get('gzip', '0').lower() in ('1', 'true', 'yes')
+    filename = f'sensor_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    if use_gzip:
+        filename += '.gz'
+    return where, params, since_id, use_gzip, filename
+
+@app.route('/api/export-csv', methods=['GET'])
+def export_csv():
+    """Export sensor data as CSV, streamed in id order.
+    
+    Query parameters are the same as /api/sensor-data, plus:
+    - since_id: only export readings with a larger id (resume an export)
+    - gzip=1: send a gzip-compressed .csv.gz file
+    """
+    where, params, since_id, use_gzip, filename = csv_export_options(request.args)
+    
+    def generate():
+        writer = CsvExportWriter(use_gzip)
+        yield writer.header()
+        for rows in iter_reading_chunks(where, params, since_id):
+            chunk = writer.rows(rows)
+            if chunk:
+                yield chunk
+        tail = writer.finish()
+        if tail:
+            yield tail
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/gzip' if use_gzip else 'text/csv',
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}'
+        }
+    )
+
+def aggregate_readings_query(bucket, where):
+    """SQL computing per-device min/avg/max per time bucket over sensor_readings"""
+    return f'''
+        SELECT 
+            device_id,
+            {BUCKET_SQL[bucket]} as bucket,
+            COUNT(*) as readings,
+            MIN(temperature) as temperature_min,
+            AVG(temperature) as temperature_avg,
+            MAX(temperature) as temperature_max,
+            MIN(humidity) as humidity_min,
+            AVG(humidity) as humidity_avg,
+            MAX(humidity) as humidity_max,
+            MIN(battery_charge) as battery_min
+        FROM sensor_readings
+        {where} AND sensor_state = 1
+        GROUP BY device_id, bucket
+        ORDER BY device_id, bucket
+    '''
+
+class _StreamSink:
+    """Write-only file object that collects bytes for a streaming response"""
+    
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+    
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self.position
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+@app.route('/api/export', methods=['GET'])
+def export_columnar():
+    """Export readings or hourly/daily rollups as Parquet or Arrow IPC.
+
+    Query parameters:
+    - format: parquet (default) or arrow (IPC stream)
+    - dataset: readings (default), hourly or daily
+    - plant, device_id, dateFrom, dateTo: same filters as /api/sensor-data
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return jsonify({'error': 'Columnar export requires pyarrow (pip install pyarrow)'}), 501
+    
+    fmt = request.args.get('format', 'parquet')
+    dataset = request.args.get('dataset', 'readings')
+    if fmt not in ('parquet', 'arrow'):
+        return jsonify({'error': 'format must be parquet or arrow'}), 400
+    if dataset not in ('readings', 'hourly', 'daily'):
+        return jsonify({'error': 'dataset must be readings, hourly or daily'}), 400
+    
+    where, params = build_reading_filters(request.args)
+    
+    if dataset == 'readings':
+        schema = pa.schema([
+            ('id', pa.int64()),
+            ('plant_unique_id', pa.string()),
+            ('sensor_name', pa.string()),
+            ('device_id', pa.string()),
+            ('time', pa.timestamp('s')),
+            ('temperature', pa.float64()),
+            ('humidity', pa.float64()),
+            ('battery_charge', pa.int32()),
+            ('sensor_state', pa.int8()),
+            ('recorded_at', pa.timestamp('s', tz='UTC'))
+        ])
+        columns = '''id, plant_unique_id, sensor_name, device_id,
+            CAST(strftime('%s', date || ' ' || time) AS INTEGER) as time,
+            temperature, humidity, battery_charge, sensor_state,
+            CAST(strftime('%s', timestamp) AS INTEGER) as recorded_at'''
+        batches = iter_reading_chunks(where, params, columns=columns)
+    else:
+        schema = pa.schema([
+            ('device_id', pa.string()),
+            ('bucket', pa.timestamp('s')),
+            ('readings', pa.int32()),
+            ('temperature_min', pa.float64()),
+            ('temperature_avg', pa.float64()),
+            ('temperature_max', pa.float64()),
+            ('humidity_min', pa.float64()),
+            ('humidity_avg', pa.float64()),
+            ('humidity_max', pa.float64()),
+            ('battery_min', pa.int32())
         ])
+        query = aggregate_readings_query('hour' if dataset == 'hourly' else 'day', where)
+        
+        def fetch_batches():
+            conn = get_db_connection()
+            try:
+                cursor = conn.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                conn.close()
+        
+        batches = fetch_batches()
     
-    # Create response
-    output.seek(0)
-    response = app.response_class(
-        output.getvalue(),
-        mimetype='text/csv',
+    def generate():
+        sink = _StreamSink()
+        if fmt == 'parquet':
+            writer = pq.ParquetWriter(sink, schema, compression='zstd')
+        else:
+            writer = pa.ipc.new_stream(sink, schema)
+        
+        # One record batch (parquet row group) per fetched chunk
+        for rows in batches:
+            arrays = [
+                pa.array([row[i] for row in rows], type=field.type)
+                for i, field in enumerate(schema)
+            ]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+        
+        writer.close()
+        yield sink.drain()
+    
+    extension = 'parquet' if fmt == 'parquet' else 'arrows'
+    mimetype = 'application/vnd.apache.parquet' if fmt == 'parquet' else 'application/vnd.apache.arrow.stream'
+    filename = f'{dataset}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
         headers={
-            'Content-Disposition': f'attachment; filename=sensor_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+            'Content-Disposition': f'attachment; filename={filename}'
         }
     )
+
+# Weeks start on Monday; the epoch (1970-01-01) was a Thursday
+WEEK_BUCKET_SQL = "(bucket - 345600) / 604800 * 604800 + 345600"
+
+def parse_bucket_bound(value, end=False):
+    """Convert a from/to parameter (epoch seconds, date or datetime) to a bucket bound.
+
+    A date-only upper bound includes that whole day.
+    """
+    if value.lstrip('-').isdigit():
+        return int(value)
+    moment = datetime.fromisoformat(value)
+    seconds = calendar.timegm(moment.timetuple())
+    if end and len(value) == 10:
+        seconds += 86400 - 1
+    return seconds
+
+def parse_id_list(args, name):
+    """Values of a repeated and/or comma separated query parameter"""
+    return [v for value in args.getlist(name) for v in value.split(',') if v]
+
+def parse_window(args):
+    """(from, to) of a query as bucket bounds; either may be None"""
+    bucket_from = parse_bucket_bound(args['from']) if 'from' in args else None
+    bucket_to = parse_bucket_bound(args['to'], end=True) if 'to' in args else None
+    return bucket_from, bucket_to
+
+def aggregate_series(conn, device_ids, bucket, bucket_from=None, bucket_to=None):
+    """Per-device min/avg/max per hour, day or week from the rollups, as {device_id: [...]}"""
+    placeholders = ','.join('?' for _ in device_ids)
+    
+    source_bucket = 'hour' if bucket == 'hour' else 'day'
+    if table_exists(conn, ROLLUP_TABLES[source_bucket]):
+        source = ROLLUP_TABLES[source_bucket]
+    else:
+        # No rollups yet: aggregate the raw readings into the same shape
+        source = '(' + ROLLUP_SELECT.format(
+            bucket=BUCKET_SQL[source_bucket], where=f'AND device_id IN ({placeholders})'
+        ) + ')'
+    
+    where = f"WHERE device_id IN ({placeholders})"
+    params = list(device_ids)
+    if bucket_from is not None:
+        where += " AND bucket >= ?"
+        params.append(bucket_from)
+    if bucket_to is not None:
+        where += " AND bucket <= ?"
+        params.append(bucket_to)
     
+    bucket_key = WEEK_BUCKET_SQL if bucket == 'week' else 'bucket'
+    query = f'''
+        SELECT
+            device_id,
+            {bucket_key} as bucket_key,
+            SUM(readings) as readings,
+            MIN(temperature_min) as temperature_min,
+            SUM(temperature_sum) / SUM(temperature_count) as temperature_avg,
+            MAX(temperature_max) as temperature_max,
+            MIN(humidity_min) as humidity_min,
+            SUM(humidity_sum) / SUM(humidity_count) as humidity_avg,
+            MAX(humidity_max) as humidity_max,
+            MIN(battery_min) as battery_min
+        FROM {source}
+        {where}
+        GROUP BY device_id, bucket_key
+        ORDER BY device_id, bucket_key
+    '''
+    if source != ROLLUP_TABLES[source_bucket]:
+        params = list(device_ids) + params
+    
+    series = {device_id: [] for device_id in device_ids}
+    for row in conn.execute(query, params):
+        series[row['device_id']].append({
+            'bucket': row['bucket_key'],
+            'readings': row['readings'],
+            'temperature_min': row['temperature_min'],
+            'temperature_avg': row['temperature_avg'],
+            'temperature_max': row['temperature_max'],
+            'humidity_min': row['humidity_min'],
+            'humidity_avg': row['humidity_avg'],
+            'humidity_max': row['humidity_max'],
+            'battery_min': row['battery_min']
+        })
+    return series
+
+@app.route('/api/sensor-aggregate', methods=['GET'])
+def get_sensor_aggregate():
+    """Per-device min/avg/max per hour, day or week.
+
+    Query parameters:
+    - bucket: hour, day (default) or week
+    - device_id: one or more, repeated or comma separated
+    - from, to: epoch seconds, YYYY-MM-DD or ISO datetime (inclusive)
+    
+    Bucket keys are epoch seconds of the bucket start in local time. Served
+    from the rollup tables, or aggregated from raw readings without them.
+    """
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in ('hour', 'day', 'week'):
+        return jsonify({'error': 'bucket must be hour, day or week'}), 400
+    
+    device_ids = parse_id_list(request.args, 'device_id')
+    if not device_ids:
+        return jsonify({'error': 'At least one device_id is required'}), 400
+    
+    try:
+        bucket_from, bucket_to = parse_window(request.args)
+    except ValueError:
+        return jsonify({'error': 'from/to must be epoch seconds, a date or an ISO datetime'}), 400
+    
+    conn = get_db_connection()
+    series = aggregate_series(conn, device_ids, bucket, bucket_from, bucket_to)
     conn.close()
-    return response
+    return jsonify({'bucket': bucket, 'series': series})
+
+HISTORY_DEFAULT_LIMIT = 100
+HISTORY_MAX_LIMIT = 10000
+
+def wall_clock(seconds):
+    """(date, time) strings of a bucket bound, as stored in sensor_readings"""
+    moment = datetime.fromtimestamp(seconds, timezone.utc)
+    return moment.strftime('%Y-%m-%d'), moment.strftime('%H:%M:%S')
+
+@app.route('/api/sensor-history', methods=['GET'])
+def get_sensor_history():
+    """Readings of several sensors in one response.
+
+    Query parameters:
+    - device_id and/or plant (plant unique IDs): repeated or comma separated
+    - from, to: epoch seconds, YYYY-MM-DD or ISO datetime (inclusive, local time)
+    - limit: readings per series, newest first (default 100)
+    - bucket: hour, day or week for min/avg/max per bucket instead of readings
+    - points: LTTB-downsample each series to about N readings, oldest first;
+      metric picks the series shape to preserve (humidity by default)
+    
+    Returns {'series': {device_id: [...]}, 'plants': {plant_id: device_id}}.
+    Without bucket, Accept: application/x-garden-series (or
+    application/x-msgpack) returns the series as compact columns with the
+    plants in the header, see garden_series_format.py.
+    """
+    mimetype = negotiate_series_format(request.accept_mimetypes)
+    bucket = request.args.get('bucket')
+    if bucket is not None and bucket not in ('hour', 'day', 'week'):
+        return jsonify({'error': 'bucket must be hour, day or week'}), 400
+    metric = request.args.get('metric', 'humidity')
+    if metric not in ('humidity', 'temperature'):
+        return jsonify({'error': 'metric must be humidity or temperature'}), 400
+    try:
+        limit = min(int(request.args.get('limit', HISTORY_DEFAULT_LIMIT)), HISTORY_MAX_LIMIT)
+        points = int(request.args['points']) if 'points' in request.args else None
+        bucket_from, bucket_to = parse_window(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit, points or from/to parameter'}), 400
+    
+    device_ids = parse_id_list(request.args, 'device_id')
+    plant_ids = parse_id_list(request.args, 'plant')
+    if not device_ids and not plant_ids:
+        return jsonify({'error': 'At least one device_id or plant is required'}), 400
+    
+    conn = get_db_connection()
+    
+    plants = {}
+    if plant_ids:
+        placeholders = ','.join('?' for _ in plant_ids)
+        for row in conn.execute(f'''
+            SELECT unique_id, sensor_id FROM garden_plants
+            WHERE unique_id IN ({placeholders}) AND has_sensor = 1 AND sensor_id IS NOT NULL
+        ''', plant_ids):
+            plants[row['unique_id']] = row['sensor_id']
+            if row['sensor_id'] not in device_ids:
+                device_ids.append(row['sensor_id'])
+    
+    if not device_ids:
+        conn.close()
+        return history_response({}, plants, mimetype)
+    
+    if bucket is not None:
+        series = aggregate_series(conn, device_ids, bucket, bucket_from, bucket_to)
+        conn.close()
+        return jsonify({'bucket': bucket, 'series': series, 'plants': plants})
+    
+    # One range scan per device over idx_sensor_readings_device_date_time
+    placeholders = ','.join('?' for _ in device_ids)
+    where = f"WHERE device_id IN ({placeholders})"
+    params = list(device_ids)
+    if bucket_from is not None:
+        where += " AND (date, time) >= (?, ?)"
+        params.extend(wall_clock(bucket_from))
+    if bucket_to is not None:
+        where += " AND (date, time) <= (?, ?)"
+        params.extend(wall_clock(bucket_to))
+    
+    series = {device_id: [] for device_id in device_ids}
+    if points is not None:
+        rows = conn.execute(f'''
+            SELECT *, CAST(strftime('%s', date || ' ' || time) AS INTEGER) as epoch
+            FROM sensor_readings {where} AND {metric} IS NOT NULL
+            ORDER BY device_id, date, time, id
+        ''', params).fetchall()
+        by_device = {}
+        for row in rows:
+            by_device.setdefault(row['device_id'], []).append(row)
+        for device_id, device_rows in by_device.items():
+            selected = lttb_indices(
+                [row['epoch'] for row in device_rows], [row[metric] for row in device_rows], points
+            )
+            series[device_id] = [reading_to_dict(device_rows[i]) for i in selected]
+    else:
+        rows = conn.execute(f'''
+            SELECT * FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY device_id ORDER BY date DESC, time DESC, id DESC
+                ) as rn
+                FROM sensor_readings {where}
+            )
+            WHERE rn <= ?
+            ORDER BY device_id, rn
+        ''', params + [limit])
+        for row in rows:
+            series[row['device_id']].append(reading_to_dict(row))
+    
+    conn.close()
+    return history_response(series, plants, mimetype)
+
+def history_response(series, plants, mimetype):
+    """Reading series of /api/sensor-history in the negotiated format"""
+    if mimetype == JSON_MIMETYPE:
+        body = json.dumps({'series': series, 'plants': plants}, separators=(',', ':'))
+    else:
+        body = encode_response_body(mimetype, series, plants=plants)
+    return series_response(body, mimetype)
+
+@app.route('/api/anomalies', methods=['GET'])
+def get_anomalies():
+    """Readings flagged by the logger's anomaly detection, newest first.
+
+    Query parameters:
+    - device_id and/or plant (plant unique IDs): repeated or comma separated
+    - metric: humidity or temperature
+    - kind: spike (far from the sensor's recent median, then back) or
+      out_of_range (physically impossible value)
+    - from, to: epoch seconds, YYYY-MM-DD or ISO datetime (inclusive, local time)
+    - since_id: only anomalies with a larger id
+    - limit: at most this many (default 100)
+    """
+    metric = request.args.get('metric')
+    if metric is not None and metric not in ('humidity', 'temperature'):
+        return jsonify({'error': 'metric must be humidity or temperature'}), 400
+    kind = request.args.get('kind')
+    if kind is not None and kind not in ('spike', 'out_of_range'):
+        return jsonify({'error': 'kind must be spike or out_of_range'}), 400
+    try:
+        limit = min(int(request.args.get('limit', HISTORY_DEFAULT_LIMIT)), HISTORY_MAX_LIMIT)
+        since_id = int(request.args.get('since_id', 0))
+        bucket_from, bucket_to = parse_window(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit, since_id or from/to parameter'}), 400
+    
+    conn = get_db_connection()
+    if not table_exists(conn, 'sensor_anomalies'):
+        conn.close()
+        return jsonify([])
+    
+    where = "WHERE id > ?"
+    params = [since_id]
+    device_ids = parse_id_list(request.args, 'device_id')
+    plant_ids = parse_id_list(request.args, 'plant')
+    if device_ids or plant_ids:
+        conditions = []
+        if device_ids:
+            conditions.append(f"device_id IN ({','.join('?' for _ in device_ids)})")
+            params.extend(device_ids)
+        if plant_ids:
+            conditions.append(f"plant_unique_id IN ({','.join('?' for _ in plant_ids)})")
+            params.extend(plant_ids)
+        where += f" AND ({' OR '.join(conditions)})"
+    if metric is not None:
+        where += " AND metric = ?"
+        params.append(metric)
+    if kind is not None:
+        where += " AND kind = ?"
+        params.append(kind)
+    if bucket_from is not None:
+        where += " AND (date, time) >= (?, ?)"
+        params.extend(wall_clock(bucket_from))
+    if bucket_to is not None:
+        where += " AND (date, time) <= (?, ?)"
+        params.extend(wall_clock(bucket_to))
+    
+    rows = conn.execute(f'''
+        SELECT id, reading_id, device_id, sensor_name, plant_unique_id, metric, kind,
+               value, median, mad, z_score, date, time, detected_at
+        FROM sensor_anomalies {where}
+        ORDER BY id DESC LIMIT ?
+    ''', params + [limit]).fetchall()
+    conn.close()
+    return jsonify([dict(row) for row in rows])
 
 @app.route('/api/gardens', methods=['GET'])
 def get_gardens():
@@ -365,10 +1383,61 @@ def get_gardens():
     conn.close()
     return jsonify(gardens)
 
+# Layout responses by layout id: (version, body). The version goes up with
+# every change to the layout, its plants or its images (database triggers).
+_garden_cache = OrderedDict()
+_garden_cache_lock = threading.Lock()
+GARDEN_CACHE_SIZE = 32
+
+def layout_etag(layout_id, version):
+    return f'layout-{layout_id}-v{version}'
+
 @app.route('/api/garden/<int:layout_id>', methods=['GET'])
 def get_garden(layout_id):
-    """Get specific garden layout with plants and images"""
+    """Get specific garden layout with plants and images.
+
+    The ETag is the layout version, so unchanged layouts are answered with
+    304 (If-None-Match) or from memory without rebuilding.
+    """
     conn = get_db_connection()
+    row = conn.execute('SELECT version FROM garden_layouts WHERE id = ?', (layout_id,)).fetchone()
+    if not row:
+        conn.close()
+        return jsonify({'error': 'Garden not found'}), 404
+    
+    version = row['version']
+    response = Response(mimetype='application/json')
+    response.set_etag(layout_etag(layout_id, version))
+    response.headers['Cache-Control'] = 'no-cache'
+    if request.if_none_match.contains_weak(layout_etag(layout_id, version)):
+        conn.close()
+        return response.make_conditional(request)
+    
+    with _garden_cache_lock:
+        cached = _garden_cache.get(layout_id)
+        if cached is not None and cached[0] == version:
+            _garden_cache.move_to_end(layout_id)
+    if cached is None or cached[0] != version:
+        payload = build_garden_payload(conn, layout_id)
+        if payload is None:
+            conn.close()
+            return jsonify({'error': 'Garden not found'}), 404
+        # The version read with the payload, in case the layout changed meanwhile
+        version = payload['version']
+        cached = (version, json.dumps(payload, separators=(',', ':')))
+        with _garden_cache_lock:
+            _garden_cache[layout_id] = cached
+            _garden_cache.move_to_end(layout_id)
+            while len(_garden_cache) > GARDEN_CACHE_SIZE:
+                _garden_cache.popitem(last=False)
+        response.set_etag(layout_etag(layout_id, version))
+    conn.close()
+    
+    response.set_data(cached[1])
+    return response.make_conditional(request)
+
+def build_garden_payload(conn, layout_id):
+    """Layout, plants and images of a garden layout, or None if there is none"""
     cursor = conn.cursor()
     
     # Get garden layout
@@ -376,8 +1445,7 @@ def get_garden(layout_id):
     layout = cursor.fetchone()
     
     if not layout:
-        conn.close()
-        return jsonify({'error': 'Garden not found'}), 404
+        return None
     
     # Get plants
     cursor.execute('''
@@ -420,55 +1488,187 @@ def get_garden(layout_id):
             'height': row['height']
         })
     
-    conn.close()
-    
-    return jsonify({
+    return {
         'id': layout['id'],
         'name': layout['name'],
+        'version': layout['version'],
         'boundary': json.loads(layout['boundary_points']),
         'plants': plants,
         'images': images
-    })
+    }
+
+# Resized photo variants are kept on disk, keyed by content hash and variant,
+# and evicted least recently used first (file mtime is the access time)
+PHOTO_CACHE_DIR = 'photo_cache'
+PHOTO_CACHE_MAX_BYTES = 64 * 1024 * 1024
+PHOTO_MAX_DIMENSION = 2048
+PHOTO_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+    'png': ('PNG', 'image/png')
+}
+_photo_cache_lock = threading.Lock()
+_photo_cache_bytes = None
+
+def _photo_cache_files():
+    """List (mtime, size, path) for every cached variant"""
+    files = []
+    for entry in os.scandir(PHOTO_CACHE_DIR):
+        if entry.is_file():
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    return files
+
+def _store_photo_variant(path, data):
+    """Write a variant to the disk cache and evict old ones over the size limit"""
+    global _photo_cache_bytes
+    with _photo_cache_lock:
+        os.makedirs(PHOTO_CACHE_DIR, exist_ok=True)
+        if _photo_cache_bytes is None:
+            _photo_cache_bytes = sum(size for _, size, _ in _photo_cache_files())
+        
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        _photo_cache_bytes += len(data)
+        
+        if _photo_cache_bytes > PHOTO_CACHE_MAX_BYTES:
+            files = sorted(_photo_cache_files())
+            _photo_cache_bytes = sum(size for _, size, _ in files)
+            for _, size, old_path in files:
+                if _photo_cache_bytes <= PHOTO_CACHE_MAX_BYTES:
+                    break
+                if old_path == path:
+                    continue
+                try:
+                    os.remove(old_path)
+                    _photo_cache_bytes -= size
+                except OSError:
+                    pass
+
+def get_photo_variant(photo_hash, width, height, fmt, load_photo):
+    """Return a resized variant of a photo, generating it once per content hash.
+
+    load_photo() is only called when the variant is not cached yet.
+    Returns None when Pillow is not available or cannot decode the photo.
+    """
+    path = os.path.join(PHOTO_CACHE_DIR, f'{photo_hash}_{width}x{height}.{fmt}')
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        os.utime(path)  # Mark as recently used
+        return data
+    except OSError:
+        pass
+    
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    
+    try:
+        image = ImageOps.exif_transpose(Image.open(io.BytesIO(load_photo())))
+        image.thumbnail((width or PHOTO_MAX_DIMENSION, height or PHOTO_MAX_DIMENSION))
+        if fmt == 'jpeg' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        image.save(output, PHOTO_FORMATS[fmt][0], quality=80)
+    except Exception as e:
+        print(f"Could not create photo variant: {e}")
+        return None
+    data = output.getvalue()
+    
+    _store_photo_variant(path, data)
+    return data
 
 @app.route('/api/plant-photo/<int:garden_plant_id>', methods=['GET'])
 def get_plant_photo(garden_plant_id):
-    """Get main photo for a specific plant with caching headers"""
+    """Get main photo for a specific plant with caching headers.
+
+    Optional w/h (max width/height, aspect ratio kept) and fmt
+    (jpeg, webp or png) return a resized variant instead of the original.
+    The ETag is the stored content hash, so conditional requests are
+    answered without reading the photo BLOB. Range requests are supported.
+    """
+    width = request.args.get('w', 0, type=int)
+    height = request.args.get('h', 0, type=int)
+    fmt = request.args.get('fmt', 'jpeg').lower()
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    if fmt not in PHOTO_FORMATS:
+        return jsonify({'error': 'fmt must be jpeg, webp or png'}), 400
+    width = max(0, min(width, PHOTO_MAX_DIMENSION))
+    height = max(0, min(height, PHOTO_MAX_DIMENSION))
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Get main photo for the plant
+    # Get main photo metadata for the plant; the BLOB is read only if needed
     cursor.execute('''
-        SELECT photo_data, photo_type 
+        SELECT id, photo_hash, COALESCE(photo_updated_at, created_at) as modified_at
         FROM plant_photos 
-        WHERE garden_plant_id = ? AND photo_type = 'main'
+        WHERE garden_plant_id = ? AND photo_type = 'main' AND photo_data IS NOT NULL
         LIMIT 1
     ''', (garden_plant_id,))
     
     result = cursor.fetchone()
-    conn.close()
+    if not result:
+        conn.close()
+        return jsonify({'error': 'Photo not found'}), 404
     
-    if result and result['photo_data']:
-        # Create response with photo data
-        response = Response(
-            result['photo_data'],
-            mimetype='image/jpeg',
-            headers={
-                'Content-Type': 'image/jpeg',
-                'Cache-Control': 'public, max-age=86400',  # Cache for 24 hours
-                'Expires': (datetime.now() + timedelta(days=1)).strftime('%a, %d %b %Y %H:%M:%S GMT'),
-                'ETag': f'"{garden_plant_id}-photo"',  # ETag for cache validation
-                'Last-Modified': datetime.now().strftime('%a, %d %b %Y %H:%M:%S GMT')
-            }
-        )
+    photo_id = result['id']
+    photo_data = None
+    
+    def load_photo():
+        nonlocal photo_data
+        if photo_data is None:
+            row = conn.execute('SELECT photo_data FROM plant_photos WHERE id = ?', (photo_id,)).fetchone()
+            photo_data = row['photo_data']
+        return photo_data
+    
+    try:
+        content_hash = result['photo_hash']
+        if content_hash is None:
+            # Photo written by an older tool: hash it once and store it
+            content_hash = photo_hash(load_photo())
+            conn.execute('UPDATE plant_photos SET photo_hash = ? WHERE id = ?', (content_hash, photo_id))
+            conn.commit()
         
-        # Handle conditional requests (browser cache validation)
-        if_none_match = request.headers.get('If-None-Match')
-        if if_none_match == f'"{garden_plant_id}-photo"':
-            return Response(status=304)  # Not Modified
+        last_modified = None
+        if result['modified_at']:
+            last_modified = datetime.strptime(result['modified_at'][:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
         
-        return response
-    else:
-        return jsonify({'error': 'Photo not found'}), 404
+        mimetype = 'image/jpeg'
+        etag = content_hash
+        is_variant = bool(width or height or fmt != 'jpeg')
+        if is_variant:
+            etag = f'{content_hash}-{width}x{height}.{fmt}'
+        
+        # Handle conditional requests (browser cache validation) before
+        # touching photo_data
+        if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            response = Response(status=304)  # Not Modified
+            response.set_etag(etag)
+            return response
+        
+        data = None
+        if is_variant:
+            data = get_photo_variant(content_hash, width, height, fmt, load_photo)
+            if data is None:
+                etag = content_hash  # Fell back to the original photo
+            else:
+                mimetype = PHOTO_FORMATS[fmt][1]
+        if data is None:
+            data = load_photo()
+    finally:
+        conn.close()
+    
+    response = Response(data, mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
 
 @app.route('/api/plants', methods=['GET'])
 def get_plants():
@@ -494,48 +1694,18 @@ def get_plants():
 
 @app.route('/api/plant-info', methods=['GET'])
 def get_plant_info():
-    """Get plant information with thresholds from database"""
+    """Get plant information with thresholds from database.
+
+    layout_id limits the plants to one garden layout.
+    """
+    try:
+        layout_key = layout_arg(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid layout_id'}), 400
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        current_season = get_current_season()
-        
-        # Get all plants with their thresholds for current season
-        cursor.execute('''
-            SELECT 
-                gp.unique_id,
-                gp.custom_name,
-                pt.name as plant_type_name,
-                pt.latin_name,
-                pth.humidity_low,
-                pth.humidity_high,
-                pth.temperature_low,
-                pth.temperature_high
-            FROM garden_plants gp
-            JOIN plant_types pt ON gp.plant_type_id = pt.id
-            LEFT JOIN plant_thresholds pth ON pt.id = pth.plant_type_id 
-                AND pth.season = ?
-            WHERE gp.has_sensor = 1
-        ''', (current_season,))
-        
-        plant_info = {}
-        for row in cursor.fetchall():
-            plant_name = row['custom_name'] or row['plant_type_name']
-            plant_info[plant_name] = {
-                "unique_id": row['unique_id'],
-                "latin_name": row['latin_name'] or '',
-                "current_season": current_season,
-                "humidity_range": {
-                    "low": row['humidity_low'] if row['humidity_low'] is not None else 30,
-                    "high": row['humidity_high'] if row['humidity_high'] is not None else 70
-                },
-                "temperature_range": {
-                    "low": row['temperature_low'] if row['temperature_low'] is not None else 10,
-                    "high": row['temperature_high'] if row['temperature_high'] is not None else 30
-                }
-            }
-        
+        threshold_resolver.refresh(conn)
+        plant_info = plant_info_map(conn, None if layout_key == 'latest' else layout_key)
         conn.close()
         return jsonify(plant_info)
         
@@ -634,17 +1804,44 @@ def update_plant_thresholds():
         conn.close()
         return jsonify({'error': str(e)}), 500
 
-def get_current_season():
-    """Get current season based on month"""
-    month = datetime.now().month
-    if month in [12, 1, 2]:
-        return "Winter"
-    elif month in [3, 4, 5]:
-        return "Spring"
-    elif month in [6, 7, 8]:
-        return "Summer"
-    else:
-        return "Autumn"
+# Effective thresholds per plant type and day, refreshed when the
+# plant_thresholds table changes
+threshold_resolver = ThresholdResolver()
+
+def plant_info_map(conn, layout_id=None):
+    """Sensor plants with today's thresholds, keyed by plant name"""
+    where = "WHERE gp.has_sensor = 1"
+    params = []
+    if layout_id is not None:
+        where += " AND gp.garden_layout_id = ?"
+        params.append(layout_id)
+    rows = conn.execute(f'''
+        SELECT gp.unique_id, gp.custom_name, gp.plant_type_id,
+               pt.name as plant_type_name, pt.latin_name
+        FROM garden_plants gp
+        JOIN plant_types pt ON gp.plant_type_id = pt.id
+        {where}
+    ''', params).fetchall()
+    
+    current_season = threshold_resolver.season()
+    plant_info = {}
+    for row in rows:
+        thresholds = threshold_resolver.resolve(row['plant_type_id'])
+        plant_name = row['custom_name'] or row['plant_type_name']
+        plant_info[plant_name] = {
+            "unique_id": row['unique_id'],
+            "latin_name": row['latin_name'] or '',
+            "current_season": current_season,
+            "humidity_range": {
+                "low": thresholds['humidity_low'],
+                "high": thresholds['humidity_high']
+            },
+            "temperature_range": {
+                "low": thresholds['temperature_low'],
+                "high": thresholds['temperature_high']
+            }
+        }
+    return plant_info
 
 @app.route('/api/garden-config', methods=['GET'])
 def get_garden_config():
@@ -665,157 +1862,560 @@ def get_garden_config():
             'frequency': 2400  # Default 40 minutes
         })
 
-@app.route('/api/dashboard-data', methods=['GET'])
-def get_dashboard_data():
-    """Get all dashboard data in one request - optimized for fast loading"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get garden layout (latest active)
-        cursor.execute('''
-            SELECT id, name, boundary_points 
-            FROM garden_layouts 
-            WHERE is_active = 1 
-            ORDER BY updated_at DESC, created_at DESC 
+LATEST_LAYOUT_SQL = '''
+    SELECT id FROM garden_layouts
+    WHERE is_active = 1
+    ORDER BY updated_at DESC, created_at DESC
+    LIMIT 1
+'''
+
+def latest_reading_ids(conn, device_ids):
+    """{device_id: id of its latest reading}, one index lookup per device"""
+    if not device_ids:
+        return {}
+    values = ','.join('(?)' for _ in device_ids)
+    rows = conn.execute(f'''
+        SELECT d.column1, (
+            SELECT id FROM sensor_readings sr
+            WHERE sr.device_id = d.column1
+            ORDER BY sr.date DESC, sr.time DESC, sr.id DESC
             LIMIT 1
-        ''')
-        layout = cursor.fetchone()
-        
-        if not layout:
-            conn.close()
-            return jsonify({'error': 'No garden found'}), 404
-            
-        layout_id = layout['id']
+        )
+        FROM (VALUES {values}) d
+    ''', list(device_ids)).fetchall()
+    return {row[0]: row[1] for row in rows if row[1] is not None}
+
+def dashboard_fingerprint(conn, layout_id):
+    """Fingerprint of everything the layout's dashboard payload is built
+    from, apart from the thresholds (see threshold_resolver.cache_key).
+
+    Cheap compared to building the payload: the layout version covers the
+    layout, plants and images, and only this layout's sensors are looked
+    at, so changes to other layouts leave it unchanged. Returns None when
+    the layout does not exist.
+    """
+    layout = conn.execute(
+        'SELECT version, updated_at, is_active FROM garden_layouts WHERE id = ?', (layout_id,)
+    ).fetchone()
+    if layout is None:
+        return None
+    
+    sensor_ids = [row[0] for row in conn.execute('''
+        SELECT DISTINCT sensor_id FROM garden_plants
+        WHERE garden_layout_id = ? AND sensor_id IS NOT NULL AND sensor_id != ''
+        ORDER BY sensor_id
+    ''', (layout_id,))]
+    parts = [tuple(layout), sorted(latest_reading_ids(conn, sensor_ids).items())]
+    if sensor_ids and table_exists(conn, 'moisture_forecasts'):
+        placeholders = ','.join('?' for _ in sensor_ids)
+        parts.append([tuple(row) for row in conn.execute(f'''
+            SELECT device_id, updated_at FROM moisture_forecasts
+            WHERE device_id IN ({placeholders}) ORDER BY device_id
+        ''', sensor_ids)])
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+def build_dashboard_payload(conn, layout_id=None):
+    """Build the dashboard payload of a layout (the latest active one by
+    default): layout, sensor values, thresholds and drying forecasts.
+
+    Returns None when there is no such garden layout.
+    """
+    cursor = conn.cursor()
+    
+    if layout_id is None:
+        row = cursor.execute(LATEST_LAYOUT_SQL).fetchone()
+        if not row:
+            return None
+        layout_id = row['id']
+    
+    garden = build_garden_payload(conn, layout_id)
+    if garden is None:
+        return None
+    sensor_ids = [plant['sensor_id'] for plant in garden['plants'] if plant['sensor_id']]
+    
+    # Get latest sensor data for all sensors, one index lookup per sensor
+    sensor_data = {}
+    if sensor_ids:
+        reading_ids = list(latest_reading_ids(conn, sensor_ids).values())
+        cursor.execute(f'''
+            SELECT * FROM sensor_readings
+            WHERE id IN ({','.join('?' for _ in reading_ids)})
+        ''', reading_ids)
         
-        # Get plants
-        cursor.execute('''
-            SELECT gp.*, pt.name as plant_type_name, pt.latin_name
-            FROM garden_plants gp
-            JOIN plant_types pt ON gp.plant_type_id = pt.id
-            WHERE gp.garden_layout_id = ?
-        ''', (layout_id,))
-        
-        plants = []
-        sensor_ids = []
         for row in cursor.fetchall():
-            plant = {
+            sensor_data[row['device_id']] = {
                 'id': row['id'],
-                'unique_id': row['unique_id'],
-                'plant_type_name': row['plant_type_name'],
-                'position_x': row['position_x'],
-                'position_y': row['position_y'],
-                'custom_name': row['custom_name'],
-                'latin_name': row['latin_name'],
-                'image_path': row['image_path'],
-                'has_sensor': bool(row['has_sensor']),
-                'sensor_id': row['sensor_id'],
-                'sensor_name': row['sensor_name']
+                'temperature': row['temperature'],
+                'humidity': row['humidity'],
+                'battery_charge': row['battery_charge'],
+                'sensor_state': row['sensor_state'],
+                'date': row['date'],
+                'time': row['time'],
+                'timestamp': row['timestamp']
             }
-            plants.append(plant)
-            if row['sensor_id']:
-                sensor_ids.append(row['sensor_id'])
-        
-        # Get images
-        cursor.execute('''
-            SELECT * FROM garden_images WHERE garden_layout_id = ?
-        ''', (layout_id,))
-        
-        images = []
+    
+    # Get plant info (thresholds) for today
+    plant_info = plant_info_map(conn, layout_id)
+    
+    # Drying forecasts, computed by the logger after each poll
+    forecasts = {}
+    if sensor_ids and table_exists(conn, 'moisture_forecasts'):
+        placeholders = ','.join('?' for _ in sensor_ids)
+        cursor.execute(f'''
+            SELECT * FROM moisture_forecasts WHERE device_id IN ({placeholders})
+        ''', sensor_ids)
         for row in cursor.fetchall():
-            images.append({
-                'id': row['id'],
-                'image_path': row['image_path'],
-                'position_x': row['position_x'],
-                'position_y': row['position_y'],
-                'width': row['width'],
-                'height': row['height']
-            })
-        
-        # Get latest sensor data for all sensors - optimized query
-        sensor_data = {}
-        if sensor_ids:
-            # Create a subquery to get the latest reading for each sensor
-            placeholders = ','.join(['?' for _ in sensor_ids])
-            cursor.execute(f'''
-                SELECT sr1.*
-                FROM sensor_readings sr1
-                INNER JOIN (
-                    SELECT device_id, MAX(date || ' ' || time) as max_datetime
-                    FROM sensor_readings 
-                    WHERE device_id IN ({placeholders})
-                    GROUP BY device_id
-                ) sr2 ON sr1.device_id = sr2.device_id 
-                AND (sr1.date || ' ' || sr1.time) = sr2.max_datetime
-            ''', sensor_ids)
-            
-            for row in cursor.fetchall():
-                sensor_data[row['device_id']] = {
-                    'temperature': row['temperature'],
-                    'humidity': row['humidity'],
-                    'battery_charge': row['battery_charge'],
-                    'sensor_state': row['sensor_state'],
-                    'date': row['date'],
-                    'time': row['time'],
-                    'timestamp': row['timestamp']
+            forecasts[row['device_id']] = {
+                'status': row['status'],
+                'humidity_low': row['humidity_low'],
+                'drying_rate': row['drying_rate'],
+                'hours_to_threshold': row['hours_to_threshold'],
+                'threshold_at': row['threshold_at'],
+                'r_squared': row['r_squared'],
+                'last_reading': row['last_reading']
+            }
+    
+    return {
+        'garden': garden,
+        'sensor_data': sensor_data,
+        'plant_info': plant_info,
+        'forecasts': forecasts
+    }
+
+# Dashboard response cache: one entry per (layout, thresholds in effect),
+# see threshold_resolver.cache_key. An entry is
+# reused while PRAGMA data_version is unchanged and, after a write, while
+# the layout's own fingerprint is unchanged, so writes that concern other
+# layouts do not rebuild it. Each layout has its own build lock, so
+# concurrent dashboards polling the same layout share a single build while
+# other layouts keep being served; _dashboard_cache_lock only guards the
+# dicts below.
+_dashboard_cache = OrderedDict()
+_dashboard_cache_lock = threading.Lock()
+_dashboard_build_locks = {}
+_latest_layout = {'version': None, 'layout_id': None}
+_all_dashboards = {'etags': None, 'body': None, 'etag': None}
+DASHBOARD_CACHE_SIZE = 32
+
+def _fresh_dashboard_entry(layout_id, version):
+    """The cached entry of a layout if it is current for this data_version"""
+    with _dashboard_cache_lock:
+        key = (layout_id, threshold_resolver.cache_key())
+        entry = _dashboard_cache.get(key)
+        if entry is not None and entry['version'] == version:
+            _dashboard_cache.move_to_end(key)
+            return entry
+    return None
+
+def _dashboard_entry(payload, version, fingerprint):
+    """Cache entry (response bodies, ETags, compact form) of a dashboard payload"""
+    # The ETags cover the content only, so rebuilding an unchanged
+    # payload after an unrelated commit still yields a 304
+    garden = payload['garden']
+    sensors_payload = dict(payload, garden={
+        'id': garden['id'], 'name': garden['name'], 'version': garden['version']
+    })
+    content = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    etag = hashlib.sha1(content.encode('utf-8')).hexdigest()
+    sensors_content = json.dumps(sensors_payload, sort_keys=True, separators=(',', ':'))
+    sensors_etag = hashlib.sha1(sensors_content.encode('utf-8')).hexdigest()
+    payload['loaded_at'] = sensors_payload['loaded_at'] = datetime.now().isoformat()
+    return {
+        'version': version,
+        'fingerprint': fingerprint,
+        'layout_version': garden['version'],
+        'body': json.dumps(payload, separators=(',', ':')),
+        'etag': etag,
+        'sensors_body': json.dumps(sensors_payload, separators=(',', ':')),
+        'sensors_etag': sensors_etag,
+        'payload': payload,
+        'compact': {
+            'id': garden['id'],
+            'name': garden['name'],
+            'plants': [
+                {
+                    'unique_id': plant['unique_id'],
+                    'name': plant['custom_name'] or plant['plant_type_name'],
+                    'sensor_id': plant['sensor_id']
                 }
+                for plant in garden['plants'] if plant['has_sensor'] and plant['sensor_id']
+            ],
+            'sensor_data': payload['sensor_data'],
+            'plant_info': payload['plant_info'],
+            'forecasts': payload['forecasts']
+        }
+    }
+
+def get_dashboard_entry(layout_key='latest', conn=None):
+    """Return the cache entry of a layout's dashboard, building it if stale.
+
+    layout_key is a layout id or 'latest' for the most recently updated
+    active layout. The entry is a dict with body and etag (the response),
+    sensors_body and sensors_etag (the response without the layout, for
+    clients that have its current version), payload, and compact (the
+    layout's part of /api/dashboards). Returns
+    None when there is no such layout. A connection is opened when needed
+    unless one is given.
+    """
+    version = get_data_version()
+    own_conn = None
+    try:
+        layout_id = layout_key
+        if layout_key == 'latest':
+            with _dashboard_cache_lock:
+                latest = dict(_latest_layout)
+            layout_id = latest['layout_id']
+            if latest['version'] != version:
+                if conn is None:
+                    own_conn = conn = get_db_connection()
+                row = conn.execute(LATEST_LAYOUT_SQL).fetchone()
+                layout_id = row['id'] if row else None
+                with _dashboard_cache_lock:
+                    _latest_layout.update(version=version, layout_id=layout_id)
+            if layout_id is None:
+                return None
         
-        # Get plant info (thresholds) for current season
-        current_season = get_current_season()
-        cursor.execute('''
-            SELECT 
-                gp.unique_id,
-                gp.custom_name,
-                pt.name as plant_type_name,
-                pt.latin_name,
-                pth.humidity_low,
-                pth.humidity_high,
-                pth.temperature_low,
-                pth.temperature_high
-            FROM garden_plants gp
-            JOIN plant_types pt ON gp.plant_type_id = pt.id
-            LEFT JOIN plant_thresholds pth ON pt.id = pth.plant_type_id 
-                AND pth.season = ?
-            WHERE gp.has_sensor = 1 AND gp.garden_layout_id = ?
-        ''', (current_season, layout_id))
-        
-        plant_info = {}
-        for row in cursor.fetchall():
-            plant_name = row['custom_name'] or row['plant_type_name']
-            plant_info[plant_name] = {
-                "unique_id": row['unique_id'],
-                "latin_name": row['latin_name'] or '',
-                "current_season": current_season,
-                "humidity_range": {
-                    "low": row['humidity_low'] if row['humidity_low'] is not None else 30,
-                    "high": row['humidity_high'] if row['humidity_high'] is not None else 70
-                },
-                "temperature_range": {
-                    "low": row['temperature_low'] if row['temperature_low'] is not None else 10,
-                    "high": row['temperature_high'] if row['temperature_high'] is not None else 30
-                }
-            }
+        entry = _fresh_dashboard_entry(layout_id, version)
+        if entry is not None:
+            return entry
         
-        conn.close()
-        
-        return jsonify({
-            'garden': {
-                'id': layout['id'],
-                'name': layout['name'],
-                'boundary': json.loads(layout['boundary_points']),
-                'plants': plants,
-                'images': images
+        with _dashboard_cache_lock:
+            build_lock = _dashboard_build_locks.setdefault(layout_id, threading.Lock())
+        with build_lock:
+            # Built by another request while this one waited
+            entry = _fresh_dashboard_entry(layout_id, version)
+            if entry is not None:
+                return entry
+            
+            if conn is None:
+                own_conn = conn = get_db_connection()
+            threshold_resolver.refresh(conn)
+            key = (layout_id, threshold_resolver.cache_key())
+            fingerprint = dashboard_fingerprint(conn, layout_id)
+            with _dashboard_cache_lock:
+                if fingerprint is None:
+                    _dashboard_cache.pop(key, None)
+                    return None
+                entry = _dashboard_cache.get(key)
+                if entry is not None and entry['fingerprint'] == fingerprint:
+                    entry['version'] = version
+                    _dashboard_cache.move_to_end(key)
+                    return entry
+            
+            payload = build_dashboard_payload(conn, layout_id)
+            if payload is None:
+                return None
+            entry = _dashboard_entry(payload, version, fingerprint)
+            with _dashboard_cache_lock:
+                _dashboard_cache[key] = entry
+                _dashboard_cache.move_to_end(key)
+                while len(_dashboard_cache) > DASHBOARD_CACHE_SIZE:
+                    _dashboard_cache.popitem(last=False)
+            return entry
+    finally:
+        if own_conn is not None:
+            own_conn.close()
+
+def get_cached_dashboard(layout_key='latest', conn=None, layout_version=None, since=None):
+    """Return a cached (body, etag) pair for a layout's dashboard, or None.
+
+    When layout_version is the layout's current version, the garden part
+    is reduced to its id, name and version. Such a response can also leave
+    out the readings a client already has: with since (a reading id), only
+    sensors with a newer reading are included, and the body has 'since'.
+    """
+    entry = get_dashboard_entry(layout_key, conn)
+    if entry is None:
+        return None
+    if layout_version is not None and layout_version == entry['layout_version']:
+        if since is None:
+            return entry['sensors_body'], entry['sensors_etag']
+        payload = entry['payload']
+        garden = payload['garden']
+        body = json.dumps(dict(
+            payload,
+            garden={'id': garden['id'], 'name': garden['name'], 'version': garden['version']},
+            sensor_data={
+                device_id: reading for device_id, reading in payload['sensor_data'].items()
+                if reading['id'] > since
             },
-            'sensor_data': sensor_data,
-            'plant_info': plant_info,
-            'loaded_at': datetime.now().isoformat()
-        })
+            since=since
+        ), separators=(',', ':'))
+        return body, f"{entry['sensors_etag']}-{since}"
+    return entry['body'], entry['etag']
+
+def layout_arg(args):
+    """layout_id query parameter as a cache key: an id, or 'latest' when absent.
+
+    Raises ValueError when it is not an integer.
+    """
+    value = args.get('layout_id')
+    return 'latest' if value in (None, '', 'latest') else int(value)
+
+@app.route('/api/dashboard-data', methods=['GET'])
+def get_dashboard_data():
+    """Get all dashboard data in one request - cached per layout.
+
+    layout_id selects the garden layout; the most recently updated active
+    layout is used without it. Clients that already have the layout pass
+    its version as layout_version and get the sensor data only, unless the
+    layout changed since. They can add since, the newest reading id they
+    have, to get only the sensors with newer readings.
+    """
+    try:
+        layout_key = layout_arg(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid layout_id'}), 400
+    layout_version = int_arg(request.args, 'layout_version', None)
+    since = int_arg(request.args, 'since', None)
+    try:
+        entry = get_cached_dashboard(layout_key, layout_version=layout_version, since=since)
+        if entry is None:
+            return jsonify({'error': 'No garden found'}), 404
+        
+        body, etag = entry
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
         
     except Exception as e:
-        if 'conn' in locals():
+        return jsonify({'error': str(e)}), 500
+
+def get_all_dashboards_body(conn):
+    """(body, etag) of /api/dashboards: compact dashboards of all active layouts"""
+    layout_ids = [row['id'] for row in conn.execute('''
+        SELECT id FROM garden_layouts
+        WHERE is_active = 1
+        ORDER BY updated_at DESC, created_at DESC
+    ''')]
+    entries = [entry for entry in (get_dashboard_entry(layout_id, conn) for layout_id in layout_ids) if entry]
+    etags = tuple(entry['etag'] for entry in entries)
+    with _dashboard_cache_lock:
+        if _all_dashboards['etags'] != etags:
+            _all_dashboards.update(
+                etags=etags,
+                body=json.dumps({
+                    'layouts': [entry['compact'] for entry in entries],
+                    'loaded_at': datetime.now().isoformat()
+                }, separators=(',', ':')),
+                etag=hashlib.sha1(' '.join(etags).encode('utf-8')).hexdigest()
+            )
+        return _all_dashboards['body'], _all_dashboards['etag']
+
+@app.route('/api/dashboards', methods=['GET'])
+def get_all_dashboards():
+    """Compact dashboards of all active layouts in one request.
+
+    Each layout has its sensor plants, latest readings, thresholds and
+    forecasts, but no geometry or images. Built from the per-layout cache.
+    """
+    try:
+        conn = get_db_connection()
+        try:
+            body, etag = get_all_dashboards_body(conn)
+        finally:
             conn.close()
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+class ChangeFeed:
+    """Watches the database and fans out dashboard diffs to SSE subscribers.
+
+    A single watcher thread polls PRAGMA data_version while at least one
+    client is connected. When it changes, the cached dashboard payload of
+    each layout with subscribers is diffed against the previous one and the
+    result is published as events for that layout:
+
+    - ``sensors``: readings of the devices whose latest value changed
+    - ``plant_info``: the full threshold map, when any threshold changed
+    - ``forecasts``: the drying forecasts of the devices whose forecast changed
+    - ``layout``: the garden itself changed, clients should reload it
+    
+    Layouts are given as dashboard cache keys (a layout id or 'latest').
+    Besides the blocking subscribe() generator, other servers can follow
+    the feed with attach()/pending()/detach() and a listener callback that
+    is called from the watcher thread whenever events are published.
+    """
+    
+    def __init__(self, poll_interval=1.0, history=100):
+        self.poll_interval = poll_interval
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=history)
+        self._last_event_id = 0
+        self._subscribers = {}
+        self._thread = None
+        self._snapshots = {}
+        self._listeners = []
+    
+    def _run(self):
+        last_version = None
+        while True:
+            with self._cond:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+                layouts = list(self._subscribers)
+            try:
+                version = get_data_version()
+                if version != last_version:
+                    last_version = version
+                    for layout_key in layouts:
+                        self._publish_changes(layout_key)
+            except Exception as e:
+                print(f"Change feed error: {e}")
+            time.sleep(self.poll_interval)
+    
+    def _publish_changes(self, layout_key):
+        entry = get_dashboard_entry(layout_key)
+        if entry is None:
+            return
+        payload = entry['payload']
+        with self._cond:
+            previous = self._snapshots.get(layout_key)
+            self._snapshots[layout_key] = payload
+        if previous is None or previous is payload:
+            return
+        
+        events = []
+        if payload['garden'] != previous['garden']:
+            events.append(('layout', {'id': payload['garden']['id'], 'version': payload['garden']['version']}))
+        changed = {
+            device_id: reading
+            for device_id, reading in payload['sensor_data'].items()
+            if previous['sensor_data'].get(device_id) != reading
+        }
+        if changed:
+            events.append(('sensors', changed))
+        if payload['plant_info'] != previous['plant_info']:
+            events.append(('plant_info', payload['plant_info']))
+        changed = {
+            device_id: forecast
+            for device_id, forecast in payload['forecasts'].items()
+            if previous['forecasts'].get(device_id) != forecast
+        }
+        if changed:
+            events.append(('forecasts', changed))
+        
+        if events:
+            with self._cond:
+                for name, data in events:
+                    self._last_event_id += 1
+                    self._events.append((self._last_event_id, layout_key, name, json.dumps(data)))
+                self._cond.notify_all()
+                listeners = list(self._listeners)
+            for listener in listeners:
+                listener()
+    
+    def add_listener(self, callback):
+        """Call callback() (from the watcher thread) after events are published"""
+        with self._cond:
+            self._listeners.append(callback)
+    
+    def remove_listener(self, callback):
+        with self._cond:
+            self._listeners.remove(callback)
+    
+    def attach(self, last_event_id=None, layout_key='latest'):
+        """Register a subscriber to a layout; returns (cursor, reset).
+
+        cursor is the id of the last event the subscriber has seen. reset
+        is True when the events it missed are no longer buffered and it
+        should reload everything.
+        
+        The first subscriber of a layout takes the snapshot that changes are
+        diffed against, so the first write after it attaches is published.
+        Snapshots are kept when the last subscriber leaves, so a client that
+        reconnects gets the changes made in between as events.
+        """
+        with self._cond:
+            needs_snapshot = layout_key not in self._snapshots
+        if needs_snapshot:
+            try:
+                entry = get_dashboard_entry(layout_key)
+            except Exception as e:
+                # The watcher takes it on its next pass instead
+                print(f"Change feed error: {e}")
+                entry = None
+            if entry is not None:
+                with self._cond:
+                    self._snapshots.setdefault(layout_key, entry['payload'])
+        with self._cond:
+            self._subscribers[layout_key] = self._subscribers.get(layout_key, 0) + 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            cursor = self._last_event_id
+            reset = False
+            # Resume after a reconnect, or ask for a full refresh if the
+            # events the client missed are no longer buffered
+            if last_event_id is not None and last_event_id < cursor:
+                oldest = self._events[0][0] if self._events else cursor + 1
+                if last_event_id + 1 >= oldest:
+                    cursor = last_event_id
+                else:
+                    reset = True
+        return cursor, reset
+    
+    def detach(self, layout_key='latest'):
+        """Unregister a subscriber; the watcher stops with the last one"""
+        with self._cond:
+            self._subscribers[layout_key] -= 1
+            if not self._subscribers[layout_key]:
+                del self._subscribers[layout_key]
+    
+    def _pending(self, cursor, layout_key):
+        # Called with the lock held
+        events = [(e[0], e[2], e[3]) for e in self._events if e[0] > cursor and e[1] == layout_key]
+        return self._last_event_id, events
+    
+    def pending(self, cursor, layout_key='latest'):
+        """(new cursor, buffered (event_id, name, data) events of the layout after cursor)"""
+        with self._cond:
+            return self._pending(cursor, layout_key)
+    
+    def subscribe(self, last_event_id=None, keepalive=25, layout_key='latest'):
+        """Yield server-sent event frames until the client disconnects"""
+        cursor, reset = self.attach(last_event_id, layout_key)
+        try:
+            yield 'retry: 5000\n\n'
+            if reset:
+                yield f'id: {cursor}\nevent: reset\ndata: {{}}\n\n'
+            while True:
+                with self._cond:
+                    if self._last_event_id == cursor:
+                        self._cond.wait(timeout=keepalive)
+                    cursor, pending = self._pending(cursor, layout_key)
+                if not pending:
+                    yield ': keepalive\n\n'
+                    continue
+                for event_id, name, data in pending:
+                    yield f'id: {event_id}\nevent: {name}\ndata: {data}\n\n'
+        finally:
+            self.detach(layout_key)
+
+change_feed = ChangeFeed()
+
+@app.route('/api/stream', methods=['GET'])
+def stream_changes():
+    """Server-sent events with dashboard diffs of one layout (layout_id, latest by default)"""
+    try:
+        layout_key = layout_arg(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid layout_id'}), 400
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    response = Response(
+        stream_with_context(change_feed.subscribe(last_event_id, layout_key=layout_key)),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Disable proxy buffering
+    return response
+
 if __name__ == '__main__':
     # Run the server
     # For production, use a proper WSGI server like gunicorn
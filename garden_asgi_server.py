@@ -0,0 +1,336 @@
+"""
+Garden ASGI Server
+Asyncio entry point for the garden API, for many concurrent dashboards.
+
+The hot routes are served by async handlers: /api/dashboard-data,
+/api/sensor-data, /api/export-csv and /api/stream. Their SQLite work runs
+on a small pool of reader threads, each with its own connection, so the
+number of threads stays fixed however many clients are connected. Idle
+server-sent event clients wait on an asyncio event rather than a thread,
+so hundreds of them can be held open on a Raspberry Pi. Every other route
+is served by the Flask app from garden_api_server.py, mounted underneath.
+
+    pip install starlette uvicorn a2wsgi
+    python garden_asgi_server.py --port 5000 --readers 4
+"""
+
+import argparse
+import asyncio
+import contextvars
+import functools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header, parse_etags
+
+import garden_api_metrics
+from garden_api_server import (
+    app as flask_app, change_feed, get_db_connection, get_cached_dashboard, layout_arg,
+    sensor_data_page, downsampled_sensor_data, int_arg, csv_export_options,
+    fetch_reading_chunk, CsvExportWriter, EXPORT_CHUNK_SIZE, negotiate_encoding, compress_data,
+    record_compression, COMPRESS_MIN_SIZE
+)
+from garden_series_format import negotiate_series_format, group_readings, encode_response_body, JSON_MIMETYPE
+
+READER_POOL_SIZE = 4
+WSGI_WORKERS = 8
+SSE_KEEPALIVE = 25
+
+# Per-request SQL totals, shared with the reader threads through the context
+_request_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+class ReaderPool:
+    """Bounded pool of SQLite reader threads, one read-only connection each"""
+
+    def __init__(self, size=READER_POOL_SIZE):
+        self.size = size
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='garden-reader')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = get_db_connection()
+            conn.execute('PRAGMA query_only = 1')
+        return conn
+
+    def _call(self, func, args):
+        stats = _request_stats.get()
+        garden_api_metrics.start_sql_timing(stats['route'] if stats else None)
+        try:
+            return func(self._connection(), *args)
+        finally:
+            sql_ms, sql_queries = garden_api_metrics.stop_sql_timing()
+            if stats is not None:
+                stats['sql_ms'] += sql_ms
+                stats['sql_queries'] += sql_queries
+
+    async def run(self, func, *args):
+        """Await func(conn, *args) on a reader thread"""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, context.run, self._call, func, args)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncChangeFeed:
+    """Follows garden_api_server's ChangeFeed from the event loop.
+
+    The feed's watcher thread wakes the loop when it publishes events;
+    subscribers are async generators waiting on an asyncio.Event.
+    """
+
+    def __init__(self, feed):
+        self.feed = feed
+        self._loop = None
+        self._wakeup = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.feed.add_listener(self._on_publish)
+
+    def stop(self):
+        self.feed.remove_listener(self._on_publish)
+
+    def _on_publish(self):
+        # Called from the watcher thread
+        self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+    async def subscribe(self, last_event_id=None, keepalive=SSE_KEEPALIVE, layout_key='latest'):
+        """Yield server-sent event frames until the client disconnects"""
+        cursor, reset = self.feed.attach(last_event_id, layout_key)
+        try:
+            yield 'retry: 5000\n\n'
+            if reset:
+                yield f'id: {cursor}\nevent: reset\ndata: {{}}\n\n'
+            while True:
+                # Take the event before checking, so a publish in between is not missed
+                wakeup = self._wakeup
+                latest, pending = self.feed.pending(cursor, layout_key)
+                if not pending and latest == cursor:
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), keepalive)
+                    except asyncio.TimeoutError:
+                        yield ': keepalive\n\n'
+                    continue
+                cursor = latest
+                for event_id, name, data in pending:
+                    yield f'id: {event_id}\nevent: {name}\ndata: {data}\n\n'
+        finally:
+            self.feed.detach(layout_key)
+
+
+pool = None
+feed = AsyncChangeFeed(change_feed)
+
+
+def timed(route):
+    """Record a handler's latency and SQL time in garden_api_metrics"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            stats = {'route': f'{request.method} {route}', 'sql_ms': 0.0, 'sql_queries': 0}
+            token = _request_stats.set(stats)
+            start = time.perf_counter()
+            status_code = 500
+            try:
+                response = await handler(request)
+                status_code = response.status_code
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                response.headers['Server-Timing'] = f"app;dur={elapsed_ms:.1f}, db;dur={stats['sql_ms']:.1f}"
+                return response
+            finally:
+                garden_api_metrics.record_request(
+                    stats['route'], (time.perf_counter() - start) * 1000, status_code,
+                    stats['sql_ms'], stats['sql_queries']
+                )
+                _request_stats.reset(token)
+        return wrapper
+    return decorator
+
+
+async def json_response(request, body, headers=None, media_type=JSON_MIMETYPE):
+    """JSON body (str) response, compressed like garden_api_server's responses.
+
+    Bodies of other media types are passed as bytes.
+    """
+    data = body.encode('utf-8') if isinstance(body, str) else body
+    headers = dict(headers or {})
+    if len(data) >= COMPRESS_MIN_SIZE:
+        headers['Vary'] = ', '.join(filter(None, [headers.get('Vary'), 'Accept-Encoding']))
+        encoding = negotiate_encoding(parse_accept_header(request.headers.get('accept-encoding')))
+        if encoding:
+            loop = asyncio.get_running_loop()
+            compressed = await loop.run_in_executor(None, compress_data, data, encoding)
+            record_compression(len(data), len(compressed))
+            data = compressed
+            headers['Content-Encoding'] = encoding
+            # The compressed body is a different representation of the same content
+            if headers.get('ETag', '').startswith('"'):
+                headers['ETag'] = 'W/' + headers['ETag']
+    return Response(data, media_type=media_type, headers=headers)
+
+
+@timed('/api/dashboard-data')
+async def dashboard_data(request):
+    """Get all dashboard data in one request - cached per layout"""
+    try:
+        layout_key = layout_arg(request.query_params)
+    except ValueError:
+        return JSONResponse({'error': 'Invalid layout_id'}, status_code=400)
+    layout_version = int_arg(request.query_params, 'layout_version', None)
+    since = int_arg(request.query_params, 'since', None)
+    try:
+        entry = await pool.run(lambda conn: get_cached_dashboard(layout_key, conn, layout_version, since))
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+    if entry is None:
+        return JSONResponse({'error': 'No garden found'}, status_code=404)
+
+    body, etag = entry
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if parse_etags(request.headers.get('if-none-match')).contains_weak(etag):
+        return Response(status_code=304, headers=headers)
+    return await json_response(request, body, headers)
+
+
+@timed('/api/sensor-data')
+async def sensor_data(request):
+    """Sensor readings, see garden_api_server.get_sensor_data"""
+    args = request.query_params
+    points = int_arg(args, 'points', 0)
+    mimetype = negotiate_series_format(parse_accept_header(request.headers.get('accept'), MIMEAccept))
+    headers = {'Vary': 'Accept'}
+    try:
+        if points:
+            body = await pool.run(lambda conn: downsampled_sensor_data(args, points, conn, mimetype))
+            return await json_response(request, body, headers, mimetype)
+        data, next_cursor = await pool.run(sensor_data_page, args)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    if next_cursor:
+        headers['X-Next-Cursor'] = next_cursor
+    if mimetype == JSON_MIMETYPE:
+        body = json.dumps(data, separators=(',', ':'))
+    else:
+        body = encode_response_body(mimetype, group_readings(data), next_cursor=next_cursor)
+    return await json_response(request, body, headers, mimetype)
+
+
+@timed('/api/export-csv')
+async def export_csv(request):
+    """Export sensor data as CSV, streamed in id order"""
+    where, params, since_id, use_gzip, filename = csv_export_options(request.query_params)
+    writer = CsvExportWriter(use_gzip)
+
+    def next_chunk(conn, last_id):
+        # Query and encode on the reader thread; the loop only sends bytes
+        rows = fetch_reading_chunk(conn, where, params, last_id)
+        return (rows[-1]['id'] if rows else None), len(rows), writer.rows(rows)
+
+    async def generate():
+        yield writer.header()
+        last_id = since_id
+        while True:
+            last_id, count, chunk = await pool.run(next_chunk, last_id)
+            if chunk:
+                yield chunk
+            if count == 0 or count < EXPORT_CHUNK_SIZE:
+                break
+        tail = writer.finish()
+        if tail:
+            yield tail
+
+    return StreamingResponse(
+        generate(),
+        media_type='application/gzip' if use_gzip else 'text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+@timed('/api/stream')
+async def stream_changes(request):
+    """Server-sent events with dashboard diffs of one layout"""
+    try:
+        layout_key = layout_arg(request.query_params)
+    except ValueError:
+        return JSONResponse({'error': 'Invalid layout_id'}, status_code=400)
+    last_event_id = int_arg(request.headers, 'last-event-id', None)
+    return StreamingResponse(
+        feed.subscribe(last_event_id, layout_key=layout_key),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def create_app(readers=READER_POOL_SIZE, wsgi_workers=WSGI_WORKERS):
+    """Starlette app with the async routes and the Flask app for the rest"""
+    @asynccontextmanager
+    async def lifespan(app):
+        global pool
+        pool = ReaderPool(readers)
+        feed.start()
+        try:
+            yield
+        finally:
+            feed.stop()
+            pool.close()
+
+    return Starlette(
+        routes=[
+            Route('/api/dashboard-data', dashboard_data, methods=['GET']),
+            Route('/api/sensor-data', sensor_data, methods=['GET']),
+            Route('/api/export-csv', export_csv, methods=['GET']),
+            Route('/api/stream', stream_changes, methods=['GET']),
+            Mount('/', app=WSGIMiddleware(flask_app, workers=wsgi_workers))
+        ],
+        middleware=[
+            Middleware(
+                CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'],
+                expose_headers=['X-Next-Cursor', 'Server-Timing']
+            )
+        ],
+        lifespan=lifespan
+    )
+
+
+# For `uvicorn garden_asgi_server:app`
+app = create_app()
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description='Garden ASGI Server')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--readers', type=int, default=READER_POOL_SIZE,
+                        help='SQLite reader threads for the async routes')
+    parser.add_argument('--wsgi-workers', type=int, default=WSGI_WORKERS,
+                        help='Threads serving the remaining Flask routes')
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.readers, args.wsgi_workers), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,11 @@ import threading
 import signal
 import sys
 import argparse
+import atexit
+from garden_db_schema import ensure_schema
+from garden_db_writer import insert_readings
+from garden_analytics import detect_anomalies, update_moisture_forecasts
+from garden_thresholds import ThresholdResolver
 
 # Configure SQLite to work with datetime properly in Python 3.12+
 sqlite3.register_adapter(datetime, lambda val: val.isoformat())
@@ -33,6 +38,11 @@ except (configparser.NoSectionError, configparser.NoOptionError) as e:
 # Database configuration
 DB_FILE = 'garden_sensors.db'
 
+# Files shared with garden_api_server.py for on-demand polls
+PID_FILE = 'garden_db_logger.pid'
+TRIGGER_FILE = 'poll_trigger.txt'
+TRIGGER_DONE_FILE = 'poll_trigger_done.txt'
+
 def check_soil_sensor_parameters(DEVICE_ID, SENSOR_TYPE):
     """Query sensor data from Tuya API"""
     try:
@@ -83,53 +93,43 @@ def load_garden_data(file_name='garden_data.json'):
 def insert_sensor_reading(conn, plant_unique_id, sensor_name, device_id, 
                          temperature, humidity, battery, sensor_state):
     """Insert a sensor reading into the database"""
-    cursor = conn.cursor()
     current_datetime = datetime.now()
     # Convert date and time to strings for SQLite compatibility
-    date_str = current_datetime.strftime('%Y-%m-%d')
-    time_str = current_datetime.strftime('%H:%M:%S')
-    
-    cursor.execute('''
-        INSERT INTO sensor_readings 
-        (plant_unique_id, sensor_name, device_id, date, time, 
-         temperature, humidity, battery_charge, sensor_state)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (plant_unique_id, sensor_name, device_id, date_str, time_str,
-          temperature, humidity, battery, sensor_state))
+    insert_readings(conn, [{
+        'plant_unique_id': plant_unique_id,
+        'sensor_name': sensor_name,
+        'device_id': device_id,
+        'date': current_datetime.strftime('%Y-%m-%d'),
+        'time': current_datetime.strftime('%H:%M:%S'),
+        'temperature': temperature,
+        'humidity': humidity,
+        'battery_charge': battery,
+        'sensor_state': sensor_state
+    }])
     
     conn.commit()
 
-def get_current_season():
-    """Get current season based on month"""
-    month = datetime.now().month
-    if month in [12, 1, 2]:
-        return "Winter"
-    elif month in [3, 4, 5]:
-        return "Spring"
-    elif month in [6, 7, 8]:
-        return "Summer"
-    else:
-        return "Autumn"
+# Effective thresholds per plant type and day (seasons from garden.ini)
+threshold_resolver = ThresholdResolver()
 
 def poll_sensors(conn):
     """Poll all sensors and save readings to database"""
     cursor = conn.cursor()
     
-    # Get current season for threshold comparison
-    current_season = get_current_season()
+    # Pick up threshold changes made since the last poll
+    threshold_resolver.refresh(conn)
     
     # Get all plants with sensors from database
     cursor.execute('''
         SELECT gp.id, gp.unique_id, gp.sensor_id, gp.sensor_name, gp.custom_name,
-               pt.name as plant_type, pt.id as plant_type_id,
-               pth.humidity_low, pth.humidity_high, pth.temperature_low, pth.temperature_high
+               pt.name as plant_type, pt.id as plant_type_id
         FROM garden_plants gp
         JOIN plant_types pt ON gp.plant_type_id = pt.id
-        LEFT JOIN plant_thresholds pth ON pt.id = pth.plant_type_id AND pth.season = ?
         WHERE gp.has_sensor = 1 AND gp.sensor_id IS NOT NULL
-    ''', (current_season,))
+    ''')
     
     plants_with_sensors = cursor.fetchall()
+    readings = []
     
     for plant in plants_with_sensors:
         garden_plant_id = plant[0]
@@ -139,10 +139,11 @@ def poll_sensors(conn):
         plant_name = plant[4] or plant[5]  # Use custom name or plant type name
         
         # Threshold values (will be None if not set)
-        humidity_low = plant[7]
-        humidity_high = plant[8]
-        temp_low = plant[9]
-        temp_high = plant[10]
+        thresholds = threshold_resolver.resolve(plant[6], fill_defaults=False)
+        humidity_low = thresholds['humidity_low']
+        humidity_high = thresholds['humidity_high']
+        temp_low = thresholds['temperature_low']
+        temp_high = thresholds['temperature_high']
         
         print(f"Polling sensor {sensor_name} (ID: {device_id}) for plant {plant_name}")
         
@@ -152,24 +153,20 @@ def poll_sensors(conn):
         if result:
             moisture, temp, battery, sensor_state = result
             
-            # Insert reading into database
-            cursor.execute('''
-                INSERT INTO sensor_readings 
-                (plant_unique_id, sensor_name, device_id, date, time, 
-                 temperature, humidity, battery_charge, sensor_state, garden_plant_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                unique_id,
-                sensor_name,
-                device_id,
-                datetime.now().strftime('%Y-%m-%d'),
-                datetime.now().strftime('%H:%M:%S'),
-                temp,
-                moisture,
-                battery,
-                sensor_state,
-                garden_plant_id
-            ))
+            # Collect the reading; the whole cycle is written in one batch
+            now = datetime.now()
+            readings.append({
+                'plant_unique_id': unique_id,
+                'sensor_name': sensor_name,
+                'device_id': device_id,
+                'date': now.strftime('%Y-%m-%d'),
+                'time': now.strftime('%H:%M:%S'),
+                'temperature': temp,
+                'humidity': moisture,
+                'battery_charge': battery,
+                'sensor_state': sensor_state,
+                'garden_plant_id': garden_plant_id
+            })
             
             if sensor_state == 1:
                 print(f"  ✓ Data recorded: Temp={temp}°C, Humidity={moisture}%, Battery={battery}%")
@@ -187,14 +184,50 @@ def poll_sensors(conn):
         else:
             print(f"  ✗ Failed to read sensor")
     
+    insert_readings(conn, readings)
     conn.commit()
+    
+    # Score the new readings against each sensor's recent history
+    try:
+        flagged = detect_anomalies(conn)
+        conn.commit()
+        if flagged:
+            print(f"  ⚠ {flagged} anomalous reading(s) flagged, see /api/anomalies")
+    except Exception as e:
+        conn.rollback()
+        print(f"Anomaly detection failed: {e}")
+    
+    # Refresh the time-to-threshold forecasts shown on the dashboard
+    try:
+        update_moisture_forecasts(conn, threshold_resolver)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Moisture forecast failed: {e}")
+
+def write_pid_file():
+    """Record this process in PID_FILE so the API server can find the logger"""
+    with open(PID_FILE, 'w') as f:
+        f.write(str(os.getpid()))
+    atexit.register(remove_pid_file)
+
+def remove_pid_file():
+    """Remove PID_FILE if it still belongs to this process"""
+    try:
+        with open(PID_FILE, 'r') as f:
+            if int(f.read().strip()) != os.getpid():
+                return
+        os.remove(PID_FILE)
+    except (OSError, ValueError):
+        pass
 
 def continuous_polling(frequency):
     """Continuously poll sensors at specified frequency"""
     print(f"\nStarting continuous polling every {frequency} seconds...")
     print("Press Ctrl+C to stop\n")
     
-    trigger_file = 'poll_trigger.txt'
+    write_pid_file()
+    trigger_file = TRIGGER_FILE
     last_trigger_time = 0
     last_poll_time = 0
     
@@ -226,6 +259,11 @@ def continuous_polling(frequency):
                 poll_sensors(conn)
                 conn.close()
                 
+                if trigger_now:
+                    # Tell the API server which trigger this poll answered
+                    with open(TRIGGER_DONE_FILE, 'w') as f:
+                        f.write(str(last_trigger_time))
+                
                 last_poll_time = current_time
                 
             # Sleep for 1 second and check again
@@ -290,6 +328,9 @@ def main():
         print("Warning: plant_thresholds table not found. Please run garden_db_migration_thresholds.py")
         print("Continuing without threshold checking...\n")
     
+    # Create indexes and auxiliary tables used by the API server
+    ensure_schema(conn)
+    
     # Check if there are any plants with sensors
     cursor.execute("""
         SELECT COUNT(*) FROM garden_plants 
@@ -305,7 +346,7 @@ def main():
         sys.exit(0)
     
     print(f"Found {sensor_count} plants with sensors")
-    print(f"Current season: {get_current_season()}")
+    print(f"Current season: {threshold_resolver.season()}")
     
     # Check if single poll mode
     if args.single_poll:
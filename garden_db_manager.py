@@ -13,6 +13,8 @@ import paramiko
 import tempfile
 import threading
 from tkinter import simpledialog
+from garden_db_schema import ensure_schema
+from garden_db_writer import readings_deleted, photo_hash
 
 class GardenDatabaseManager:
     def __init__(self, root):
@@ -438,6 +440,9 @@ class GardenDatabaseManager:
             ''')
             
             self.conn.commit()
+        
+        # Indexes, rollups and photo_hash column shared with the API server
+        ensure_schema(self.conn)
     
     def create_widgets(self):
         """Create the main interface"""
@@ -1544,10 +1549,15 @@ class GardenDatabaseManager:
         if messagebox.askyesno("Confirm Delete", f"Delete {len(selection)} selected reading(s)?"):
             try:
                 cursor = self.conn.cursor()
+                deleted = []
                 for item in selection:
                     reading_id = self.readings_tree.item(item)['values'][0]
+                    cursor.execute('SELECT id, device_id, sensor_name, date, time FROM sensor_readings WHERE id = ?', (reading_id,))
+                    deleted.extend(cursor.fetchall())
                     cursor.execute('DELETE FROM sensor_readings WHERE id = ?', (reading_id,))
                 
+                # Keep the rollups and statistics consistent with the deletion
+                readings_deleted(self.conn, deleted)
                 self.conn.commit()
                 self.load_sensor_readings()
                 messagebox.showinfo("Success", f"Deleted {len(selection)} reading(s)")
@@ -1658,10 +1668,10 @@ class GardenDatabaseManager:
                 # Insert into database with blob data
                 cursor.execute('''
                     INSERT INTO plant_photos 
-                    (garden_plant_id, photo_data, photo_type, description, date_taken, file_size)
-                    VALUES (?, ?, ?, ?, ?, ?)
+                    (garden_plant_id, photo_data, photo_type, description, date_taken, file_size, photo_hash)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
                 ''', (plant_id, photo_data, photo_type, 
-                     f"Photo {added_count + 1}", date_taken, len(photo_data)))
+                     f"Photo {added_count + 1}", date_taken, len(photo_data), photo_hash(photo_data)))
                 
                 added_count += 1
                 
@@ -0,0 +1,387 @@
+"""
+Garden Database Schema
+Base tables, and the indexes and auxiliary tables shared by the API server
+and the sensor logger. Every step is idempotent and skips tables that do
+not exist yet.
+"""
+
+import sqlite3
+
+# Integer bucket keys: epoch seconds of the bucket start. Reading dates and
+# times are local wall-clock time, so the keys are too.
+BUCKET_SQL = {
+    'hour': "CAST(strftime('%s', date || ' ' || time) AS INTEGER) / 3600 * 3600",
+    'day': "CAST(strftime('%s', date) AS INTEGER)"
+}
+
+# Rollup table for each bucket size, maintained by garden_db_writer
+ROLLUP_TABLES = {
+    'hour': 'sensor_readings_hourly',
+    'day': 'sensor_readings_daily'
+}
+
+# Aggregates stored per (device_id, bucket); sums and counts are kept
+# instead of averages so that buckets can be combined (days into weeks)
+ROLLUP_SELECT = '''
+    SELECT
+        device_id,
+        {bucket} as bucket,
+        COUNT(*) as readings,
+        COUNT(temperature) as temperature_count,
+        SUM(temperature) as temperature_sum,
+        MIN(temperature) as temperature_min,
+        MAX(temperature) as temperature_max,
+        COUNT(humidity) as humidity_count,
+        SUM(humidity) as humidity_sum,
+        MIN(humidity) as humidity_min,
+        MAX(humidity) as humidity_max,
+        MIN(battery_charge) as battery_min
+    FROM sensor_readings
+    WHERE sensor_state = 1 {where}
+    GROUP BY device_id, bucket
+'''
+
+# Per day and sensor: active readings and the sums behind the daily averages
+DAILY_STATS_SELECT = '''
+    SELECT
+        date,
+        sensor_name,
+        COUNT(*),
+        COUNT(temperature),
+        TOTAL(temperature),
+        COUNT(humidity),
+        TOTAL(humidity)
+    FROM sensor_readings
+    WHERE sensor_state = 1 AND sensor_name IS NOT NULL {where}
+    GROUP BY date, sensor_name
+'''
+
+# Battery levels under 20% seen per day and sensor
+LOW_BATTERY_THRESHOLD = 20
+LOW_BATTERY_SELECT = f'''
+    SELECT DISTINCT date, sensor_name, battery_charge
+    FROM sensor_readings
+    WHERE battery_charge < {LOW_BATTERY_THRESHOLD} AND sensor_name IS NOT NULL {{where}}
+'''
+
+# Base tables: the garden editor (garden.py) creates the layout tables,
+# garden_db_manager.py the thresholds and the sensor logger the readings.
+# ensure_schema adds the indexes, triggers and derived tables on top.
+BASE_TABLES = {
+    'garden_layouts': '''
+        CREATE TABLE IF NOT EXISTS garden_layouts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            boundary_points TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active INTEGER DEFAULT 1
+        )
+    ''',
+    'plant_types': '''
+        CREATE TABLE IF NOT EXISTS plant_types (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            latin_name TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''',
+    'garden_plants': '''
+        CREATE TABLE IF NOT EXISTS garden_plants (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            garden_layout_id INTEGER NOT NULL,
+            plant_type_id INTEGER NOT NULL,
+            custom_name TEXT,
+            position_x REAL NOT NULL,
+            position_y REAL NOT NULL,
+            has_sensor INTEGER DEFAULT 0,
+            sensor_id TEXT,
+            sensor_name TEXT,
+            unique_id TEXT NOT NULL,
+            image_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (garden_layout_id) REFERENCES garden_layouts (id),
+            FOREIGN KEY (plant_type_id) REFERENCES plant_types (id)
+        )
+    ''',
+    'plant_photos': '''
+        CREATE TABLE IF NOT EXISTS plant_photos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            garden_plant_id INTEGER NOT NULL,
+            photo_data BLOB,
+            photo_type TEXT DEFAULT 'main',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (garden_plant_id) REFERENCES garden_plants (id)
+        )
+    ''',
+    'garden_images': '''
+        CREATE TABLE IF NOT EXISTS garden_images (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            garden_layout_id INTEGER NOT NULL,
+            image_path TEXT NOT NULL,
+            position_x REAL NOT NULL,
+            position_y REAL NOT NULL,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (garden_layout_id) REFERENCES garden_layouts (id)
+        )
+    ''',
+    'plant_thresholds': '''
+        CREATE TABLE IF NOT EXISTS plant_thresholds (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            plant_type_id INTEGER NOT NULL,
+            season TEXT NOT NULL,
+            humidity_low INTEGER,
+            humidity_high INTEGER,
+            temperature_low INTEGER,
+            temperature_high INTEGER,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME,
+            FOREIGN KEY (plant_type_id) REFERENCES plant_types(id),
+            UNIQUE(plant_type_id, season)
+        )
+    ''',
+    'sensor_readings': '''
+        CREATE TABLE IF NOT EXISTS sensor_readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            plant_unique_id TEXT,
+            sensor_name TEXT,
+            device_id TEXT,
+            date TEXT,
+            time TEXT,
+            temperature REAL,
+            humidity REAL,
+            battery_charge INTEGER,
+            sensor_state INTEGER,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            garden_plant_id INTEGER
+        )
+    '''
+}
+
+
+def create_base_tables(conn, tables=BASE_TABLES):
+    """Create the missing base tables (all, or the given names). Does not
+    add indexes or derived tables; call ensure_schema for those."""
+    for table in tables:
+        conn.execute(BASE_TABLES[table])
+
+
+def table_exists(conn, table_name):
+    """Check if a table exists"""
+    cursor = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
+        (table_name,)
+    )
+    return cursor.fetchone() is not None
+
+
+def ensure_schema(conn):
+    """Create missing indexes and auxiliary tables"""
+    cursor = conn.cursor()
+
+    if table_exists(conn, 'sensor_readings'):
+        # Keyset pagination over (timestamp, id), globally and per device
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_sensor_readings_timestamp_id
+            ON sensor_readings(timestamp, id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_sensor_readings_device_timestamp_id
+            ON sensor_readings(device_id, timestamp, id)
+        ''')
+        # Rollup maintenance recomputes one device's hour or day at a time
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_sensor_readings_device_date_time
+            ON sensor_readings(device_id, date, time)
+        ''')
+
+        for bucket, table in ROLLUP_TABLES.items():
+            if not table_exists(conn, table):
+                print(f"Creating {table} table...")
+                cursor.execute(f'''
+                    CREATE TABLE {table} (
+                        device_id TEXT NOT NULL,
+                        bucket INTEGER NOT NULL,
+                        readings INTEGER NOT NULL,
+                        temperature_count INTEGER,
+                        temperature_sum REAL,
+                        temperature_min REAL,
+                        temperature_max REAL,
+                        humidity_count INTEGER,
+                        humidity_sum REAL,
+                        humidity_min REAL,
+                        humidity_max REAL,
+                        battery_min INTEGER,
+                        PRIMARY KEY (device_id, bucket)
+                    ) WITHOUT ROWID
+                ''')
+                cursor.execute(
+                    f"INSERT INTO {table} " + ROLLUP_SELECT.format(bucket=BUCKET_SQL[bucket], where='')
+                )
+
+    if table_exists(conn, 'sensor_readings') and not table_exists(conn, 'sensor_stats'):
+        # Counters behind /api/sensor-stats, kept current by garden_db_writer
+        print("Creating sensor statistics tables...")
+        cursor.execute('''
+            CREATE TABLE sensor_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE sensor_daily_stats (
+                date TEXT NOT NULL,
+                sensor_name TEXT NOT NULL,
+                active_readings INTEGER NOT NULL DEFAULT 0,
+                temperature_count INTEGER NOT NULL DEFAULT 0,
+                temperature_sum REAL NOT NULL DEFAULT 0,
+                humidity_count INTEGER NOT NULL DEFAULT 0,
+                humidity_sum REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (date, sensor_name)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE sensor_low_battery (
+                date TEXT NOT NULL,
+                sensor_name TEXT NOT NULL,
+                battery_charge INTEGER NOT NULL,
+                PRIMARY KEY (date, sensor_name, battery_charge)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute(
+            "INSERT INTO sensor_stats SELECT 'total_readings', COUNT(*) FROM sensor_readings"
+        )
+        cursor.execute("INSERT INTO sensor_daily_stats " + DAILY_STATS_SELECT.format(where=''))
+        cursor.execute("INSERT INTO sensor_low_battery " + LOW_BATTERY_SELECT.format(where=''))
+
+    if table_exists(conn, 'sensor_readings'):
+        # Flagged readings, written by garden_analytics.detect_anomalies
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sensor_anomalies (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                reading_id INTEGER NOT NULL,
+                device_id TEXT NOT NULL,
+                sensor_name TEXT,
+                plant_unique_id TEXT,
+                metric TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                value REAL,
+                median REAL,
+                mad REAL,
+                z_score REAL,
+                date TEXT,
+                time TEXT,
+                detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (reading_id, metric)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_sensor_anomalies_device_id
+            ON sensor_anomalies(device_id, id)
+        ''')
+        # Progress markers of incremental analytics jobs (last processed reading id)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS analytics_state (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        # Latest drying forecast per sensor, replaced by
+        # garden_analytics.update_moisture_forecasts after each poll
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS moisture_forecasts (
+                device_id TEXT PRIMARY KEY,
+                plant_unique_id TEXT,
+                sensor_name TEXT,
+                humidity_low REAL,
+                current_humidity REAL,
+                drying_rate REAL,
+                hours_to_threshold REAL,
+                threshold_at TEXT,
+                status TEXT NOT NULL,
+                fitted_points INTEGER,
+                r_squared REAL,
+                segment_start TEXT,
+                last_reading TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+    if table_exists(conn, 'garden_layouts'):
+        cursor.execute("PRAGMA table_info(garden_layouts)")
+        columns = [col[1] for col in cursor.fetchall()]
+        # Goes up whenever the layout, its plants or its images change;
+        # used for ETags and caches of layout payloads
+        if 'version' not in columns:
+            print("Adding version column to garden_layouts table...")
+            cursor.execute("ALTER TABLE garden_layouts ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_garden_layouts_version
+            AFTER UPDATE OF name, boundary_points, is_active ON garden_layouts
+            WHEN NEW.version IS OLD.version
+            BEGIN
+                UPDATE garden_layouts SET version = OLD.version + 1 WHERE id = NEW.id;
+            END
+        ''')
+        for table in ('garden_plants', 'garden_images'):
+            if not table_exists(conn, table):
+                continue
+            for event, layout_ids in (
+                ('INSERT', 'NEW.garden_layout_id'),
+                ('DELETE', 'OLD.garden_layout_id'),
+                ('UPDATE', 'OLD.garden_layout_id, NEW.garden_layout_id')
+            ):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_layout_version
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE garden_layouts SET version = version + 1
+                        WHERE id IN ({layout_ids});
+                    END
+                ''')
+        if table_exists(conn, 'plant_types') and table_exists(conn, 'garden_plants'):
+            # Layout payloads include the plant type names
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS trg_plant_types_layout_version
+                AFTER UPDATE OF name, latin_name ON plant_types
+                BEGIN
+                    UPDATE garden_layouts SET version = version + 1
+                    WHERE id IN (
+                        SELECT garden_layout_id FROM garden_plants WHERE plant_type_id = NEW.id
+                    );
+                END
+            ''')
+
+    if table_exists(conn, 'plant_photos'):
+        cursor.execute("PRAGMA table_info(plant_photos)")
+        columns = [col[1] for col in cursor.fetchall()]
+        # Content hash for ETags and the variant cache; NULL until computed
+        if 'photo_hash' not in columns:
+            print("Adding photo_hash column to plant_photos table...")
+            cursor.execute("ALTER TABLE plant_photos ADD COLUMN photo_hash TEXT")
+        if 'photo_updated_at' not in columns:
+            cursor.execute("ALTER TABLE plant_photos ADD COLUMN photo_updated_at TIMESTAMP")
+        # Writers that replace photo_data without a new hash get it cleared,
+        # so a stale hash is never served
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_plant_photos_data_updated
+            AFTER UPDATE OF photo_data ON plant_photos
+            BEGIN
+                UPDATE plant_photos SET
+                    photo_hash = CASE WHEN NEW.photo_hash IS OLD.photo_hash
+                                      THEN NULL ELSE NEW.photo_hash END,
+                    photo_updated_at = CURRENT_TIMESTAMP
+                WHERE id = NEW.id;
+            END
+        ''')
+
+    conn.commit()
+
+
+if __name__ == '__main__':
+    conn = sqlite3.connect('garden_sensors.db')
+    ensure_schema(conn)
+    conn.close()
+    print("Schema is up to date")
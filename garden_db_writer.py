@@ -0,0 +1,178 @@
+"""
+Garden Database Writer
+Shared write path for sensor readings and photos. Inserts readings in batches
+and keeps the derived tables (hourly and daily rollups, statistics counters)
+in step with them.
+"""
+
+import hashlib
+
+from garden_db_schema import (
+    BUCKET_SQL, ROLLUP_TABLES, ROLLUP_SELECT, DAILY_STATS_SELECT,
+    LOW_BATTERY_SELECT, LOW_BATTERY_THRESHOLD, table_exists
+)
+
+READING_COLUMNS = (
+    'plant_unique_id', 'sensor_name', 'device_id', 'date', 'time',
+    'temperature', 'humidity', 'battery_charge', 'sensor_state', 'garden_plant_id'
+)
+
+
+def insert_readings(conn, readings):
+    """Insert a batch of readings and update the rollups. Does not commit.
+
+    Each reading is a dict with the READING_COLUMNS keys and an optional
+    'timestamp'; the database default (now) is used when it is missing.
+    """
+    if not readings:
+        return
+    conn.executemany(f'''
+        INSERT INTO sensor_readings
+        ({', '.join(READING_COLUMNS)}, timestamp)
+        VALUES ({', '.join('?' for _ in READING_COLUMNS)}, COALESCE(?, CURRENT_TIMESTAMP))
+    ''', [
+        tuple(reading.get(column) for column in READING_COLUMNS) + (reading.get('timestamp'),)
+        for reading in readings
+    ])
+    refresh_rollups(conn, readings)
+    update_stats(conn, readings)
+
+
+def insert_new_readings(conn, readings):
+    """Insert the readings not stored yet and update the rollups. Does not commit.
+
+    A reading is identified by (device_id, date, time); later duplicates
+    within the batch are dropped. Run inside a write transaction (BEGIN
+    IMMEDIATE) so no other writer can store the same reading between the
+    check and the insert. Returns the inserted readings.
+    """
+    batch = {}
+    for reading in readings:
+        batch.setdefault((reading['device_id'], reading['date'], reading['time']), reading)
+
+    by_device = {}
+    for device_id, date, time in batch:
+        by_device.setdefault(device_id, []).append((date, time))
+    # One range scan per device over idx_sensor_readings_device_date_time
+    stored = set()
+    for device_id, keys in by_device.items():
+        stored.update(tuple(row) for row in conn.execute('''
+            SELECT device_id, date, time FROM sensor_readings
+            WHERE device_id = ? AND (date, time) >= (?, ?) AND (date, time) <= (?, ?)
+        ''', (device_id, *min(keys), *max(keys))))
+
+    new = [reading for key, reading in batch.items() if key not in stored]
+    insert_readings(conn, new)
+    return new
+
+
+def update_stats(conn, readings):
+    """Add newly inserted readings to the sensor_stats counters"""
+    if not table_exists(conn, 'sensor_stats'):
+        return
+
+    conn.execute(
+        "UPDATE sensor_stats SET value = value + ? WHERE name = 'total_readings'",
+        (len(readings),)
+    )
+    conn.executemany('''
+        INSERT INTO sensor_daily_stats
+        (date, sensor_name, active_readings, temperature_count, temperature_sum,
+         humidity_count, humidity_sum)
+        VALUES (?, ?, 1, ?, ?, ?, ?)
+        ON CONFLICT (date, sensor_name) DO UPDATE SET
+            active_readings = active_readings + 1,
+            temperature_count = temperature_count + excluded.temperature_count,
+            temperature_sum = temperature_sum + excluded.temperature_sum,
+            humidity_count = humidity_count + excluded.humidity_count,
+            humidity_sum = humidity_sum + excluded.humidity_sum
+    ''', [
+        (
+            r['date'], r['sensor_name'],
+            int(r.get('temperature') is not None), r.get('temperature') or 0,
+            int(r.get('humidity') is not None), r.get('humidity') or 0
+        )
+        for r in readings
+        if r.get('sensor_state') == 1 and r.get('sensor_name') is not None
+    ])
+    conn.executemany(
+        "INSERT OR IGNORE INTO sensor_low_battery (date, sensor_name, battery_charge) VALUES (?, ?, ?)",
+        [
+            (r['date'], r['sensor_name'], r['battery_charge'])
+            for r in readings
+            if r.get('battery_charge') is not None
+            and r['battery_charge'] < LOW_BATTERY_THRESHOLD
+            and r.get('sensor_name') is not None
+        ]
+    )
+
+
+def readings_deleted(conn, readings):
+    """Bring the derived tables back in line after readings were deleted.
+
+    readings are the deleted rows (id, device_id, sensor_name, date, time).
+    """
+    refresh_rollups(conn, readings)
+    if table_exists(conn, 'sensor_anomalies'):
+        conn.executemany(
+            "DELETE FROM sensor_anomalies WHERE reading_id = ?",
+            [(r['id'],) for r in readings]
+        )
+    if not table_exists(conn, 'sensor_stats'):
+        return
+
+    conn.execute(
+        "UPDATE sensor_stats SET value = value - ? WHERE name = 'total_readings'",
+        (len(readings),)
+    )
+    keys = sorted({(r['date'], r['sensor_name']) for r in readings})
+    conn.executemany("DELETE FROM sensor_daily_stats WHERE date = ? AND sensor_name = ?", keys)
+    conn.executemany(
+        "INSERT INTO sensor_daily_stats " + DAILY_STATS_SELECT.format(where='AND date = ? AND sensor_name = ?'),
+        keys
+    )
+    conn.executemany("DELETE FROM sensor_low_battery WHERE date = ? AND sensor_name = ?", keys)
+    conn.executemany(
+        "INSERT INTO sensor_low_battery " + LOW_BATTERY_SELECT.format(where='AND date = ? AND sensor_name = ?'),
+        keys
+    )
+
+
+def refresh_rollups(conn, readings):
+    """Recompute the hourly and daily rollup rows touched by these readings"""
+    if not table_exists(conn, ROLLUP_TABLES['hour']):
+        return
+
+    days = sorted({(r['device_id'], r['date']) for r in readings})
+    hours = sorted({(r['device_id'], r['date'], r['time'][:2]) for r in readings})
+
+    # Delete and re-aggregate, so a bucket left without active readings
+    # does not keep its old row
+    conn.executemany(f'''
+        DELETE FROM {ROLLUP_TABLES['day']}
+        WHERE device_id = ? AND bucket = CAST(strftime('%s', ?) AS INTEGER)
+    ''', days)
+    conn.executemany(
+        f"INSERT INTO {ROLLUP_TABLES['day']} "
+        + ROLLUP_SELECT.format(bucket=BUCKET_SQL['day'], where="AND device_id = ? AND date = ?"),
+        days
+    )
+
+    hour_params = [(device_id, date, f'{hour}:00:00', f'{hour}:59:59') for device_id, date, hour in hours]
+    conn.executemany(f'''
+        DELETE FROM {ROLLUP_TABLES['hour']}
+        WHERE device_id = ? AND bucket = CAST(strftime('%s', ? || ' ' || ?) AS INTEGER)
+    ''', [params[:3] for params in hour_params])
+    conn.executemany(
+        f"INSERT INTO {ROLLUP_TABLES['hour']} "
+        + ROLLUP_SELECT.format(
+            bucket=BUCKET_SQL['hour'],
+            where="AND device_id = ? AND date = ? AND time BETWEEN ? AND ?"
+        ),
+        hour_params
+    )
+
+
+def photo_hash(photo_data):
+    """Content hash stored in plant_photos.photo_hash"""
+    return hashlib.sha1(photo_data).hexdigest()
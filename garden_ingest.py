@@ -0,0 +1,206 @@
+"""
+Garden Ingest
+Parses and validates batches of readings posted to /api/readings by
+sensors the logger does not poll (DIY or other external sensors).
+
+A batch is JSON, a list of readings or {"readings": [...]}:
+
+    [{"device_id": "bf12...", "timestamp": 1760860800, "humidity": 41.5,
+      "temperature": 20.1, "battery_charge": 87}]
+
+or InfluxDB line protocol, one reading per line, tagged with the device:
+
+    soil,device_id=bf12... humidity=41.5,temperature=20.1,battery_charge=87i 1760860800000000000
+
+The measurement name is ignored. Timestamps are Unix time; JSON uses
+seconds (or an ISO datetime, or date and time fields in local time) and
+line protocol uses the precision query parameter (ns by default). They are
+stored in the server's local time, like the logger's readings, and as UTC
+in the timestamp column. Without a timestamp the reading is taken now.
+
+Readings must come from a device that is the sensor of a garden plant,
+whose plant and sensor name are filled in. Fields other than the ones in
+VALUE_FIELDS are ignored.
+"""
+
+import json
+import math
+import re
+from datetime import datetime, timedelta, timezone
+
+# Accepted value fields, with their line protocol aliases
+VALUE_FIELDS = ('temperature', 'humidity', 'battery_charge', 'sensor_state')
+FIELD_ALIASES = {'battery': 'battery_charge', 'state': 'sensor_state'}
+DEVICE_TAGS = ('device_id', 'device')
+
+# Most readings accepted in one request
+INGEST_MAX_READINGS = 10000
+# Readings further ahead of the server clock are rejected
+INGEST_MAX_FUTURE = timedelta(minutes=5)
+# Errors listed in a response
+INGEST_MAX_ERRORS = 50
+
+PRECISIONS = {'s': 1, 'ms': 1e3, 'us': 1e6, 'ns': 1e9}
+
+_UNESCAPED_SPACE = re.compile(r'(?<!\\) ')
+_UNESCAPED_COMMA = re.compile(r'(?<!\\),')
+_ESCAPE = re.compile(r'\\([ ,=\\])')
+
+
+def known_devices(conn):
+    """{device_id: (garden_plant_id, plant_unique_id, sensor_name)} of the plants with sensors"""
+    devices = {}
+    for row in conn.execute('''
+        SELECT id, unique_id, sensor_id, sensor_name FROM garden_plants
+        WHERE has_sensor = 1 AND sensor_id IS NOT NULL
+        ORDER BY id
+    '''):
+        devices.setdefault(row[2], (row[0], row[1], row[3]))
+    return devices
+
+
+def parse_json_batch(body):
+    """Readings of a JSON batch as a list of dicts; raises ValueError"""
+    try:
+        batch = json.loads(body)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f'Invalid JSON: {e}')
+    if isinstance(batch, dict):
+        batch = batch.get('readings')
+    if not isinstance(batch, list):
+        raise ValueError('Expected a list of readings or {"readings": [...]}')
+    return batch
+
+
+def _unescape(value):
+    return _ESCAPE.sub(r'\1', value)
+
+
+def parse_line(line, precision='ns'):
+    """One line protocol line as a reading dict; raises ValueError"""
+    parts = _UNESCAPED_SPACE.split(line.strip())
+    if len(parts) not in (2, 3):
+        raise ValueError('expected "measurement,tags fields [timestamp]"')
+
+    tags = {}
+    for tag in _UNESCAPED_COMMA.split(parts[0])[1:]:
+        key, _, value = tag.partition('=')
+        tags[_unescape(key)] = _unescape(value)
+    reading = {'device_id': next((tags[t] for t in DEVICE_TAGS if t in tags), None)}
+    if reading['device_id'] is None:
+        raise ValueError('device_id tag is required')
+
+    for field in _UNESCAPED_COMMA.split(parts[1]):
+        key, equals, value = field.partition('=')
+        if not equals:
+            raise ValueError('fields must be key=value')
+        key = _unescape(key)
+        key = FIELD_ALIASES.get(key, key)
+        if key not in VALUE_FIELDS:
+            continue
+        try:
+            reading[key] = int(value[:-1]) if value[-1:] in ('i', 'u') else float(value)
+        except ValueError:
+            raise ValueError(f'{key} must be a number')
+
+    if len(parts) == 3:
+        try:
+            reading['timestamp'] = int(parts[2]) / PRECISIONS[precision]
+        except ValueError:
+            raise ValueError('timestamp must be an integer')
+    return reading
+
+
+def parse_line_protocol(body, precision='ns'):
+    """Readings of a line protocol batch as (readings, line numbers, errors),
+    skipping blank and comment lines; errors are (line number, message)"""
+    if precision not in PRECISIONS:
+        raise ValueError('precision must be s, ms, us or ns')
+    readings, numbers, errors = [], [], []
+    for number, line in enumerate(body.splitlines(), 1):
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        try:
+            readings.append(parse_line(line, precision))
+            numbers.append(number)
+        except ValueError as e:
+            errors.append((number, str(e)))
+    return readings, numbers, errors
+
+
+def _reading_time(reading, now):
+    """Local datetime of a reading, from timestamp or date and time"""
+    timestamp = reading.get('timestamp')
+    if timestamp is None and reading.get('date') is not None:
+        timestamp = f"{reading['date']} {reading.get('time') or '00:00:00'}"
+    if timestamp is None:
+        return now
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        return datetime.fromtimestamp(timestamp)
+    if isinstance(timestamp, str):
+        moment = datetime.fromisoformat(timestamp)
+        # An offset is converted to local time, naive times already are
+        return moment.astimezone().replace(tzinfo=None) if moment.tzinfo else moment
+    raise ValueError('timestamp must be Unix seconds or an ISO datetime')
+
+
+def validate_reading(reading, devices, now):
+    """Reading in the garden_db_writer shape, or ValueError"""
+    if not isinstance(reading, dict):
+        raise ValueError('reading must be an object')
+    device = devices.get(reading.get('device_id'))
+    if device is None:
+        raise ValueError(f"unknown device_id {reading.get('device_id')!r}")
+
+    values = {}
+    for field in VALUE_FIELDS:
+        value = reading.get(field)
+        if value is not None and (
+            isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value)
+        ):
+            raise ValueError(f'{field} must be a number')
+        values[field] = value
+    if values['temperature'] is None and values['humidity'] is None:
+        raise ValueError('temperature or humidity is required')
+    if values['sensor_state'] is None:
+        values['sensor_state'] = 1
+    if values['sensor_state'] not in (0, 1):
+        raise ValueError('sensor_state must be 0 or 1')
+
+    try:
+        moment = _reading_time(reading, now)
+    except (ValueError, OverflowError, OSError) as e:
+        raise ValueError(f'invalid timestamp: {e}')
+    if moment > now + INGEST_MAX_FUTURE:
+        raise ValueError('timestamp is in the future')
+
+    garden_plant_id, plant_unique_id, sensor_name = device
+    return {
+        'plant_unique_id': plant_unique_id,
+        'sensor_name': sensor_name,
+        'device_id': reading['device_id'],
+        'date': moment.strftime('%Y-%m-%d'),
+        'time': moment.strftime('%H:%M:%S'),
+        'temperature': values['temperature'],
+        'humidity': values['humidity'],
+        'battery_charge': values['battery_charge'],
+        'sensor_state': int(values['sensor_state']),
+        'garden_plant_id': garden_plant_id,
+        # sensor_readings.timestamp is UTC; without it the insert time is stored
+        'timestamp': moment.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+def validate_readings(readings, devices, positions=None):
+    """Split parsed readings into (valid readings, errors as (position, message)).
+
+    Positions are the readings' indexes unless given (line numbers).
+    """
+    now = datetime.now()
+    valid, errors = [], []
+    for index, reading in enumerate(readings):
+        try:
+            valid.append(validate_reading(reading, devices, now))
+        except ValueError as e:
+            errors.append((positions[index] if positions else index, str(e)))
+    return valid, errors
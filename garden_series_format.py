@@ -0,0 +1,143 @@
+"""
+Garden Series Format
+Compact encodings of sensor reading series for /api/sensor-data and
+/api/sensor-history, chosen by the request's Accept header:
+
+- application/x-garden-series: columnar typed arrays that the web
+  interface reads straight into Int32Array/Float32Array views
+- application/x-msgpack: the same columns as MessagePack, when the
+  msgpack package is installed (pip install msgpack)
+- application/json otherwise
+
+Readings are grouped into one series per device. Dates and times become
+epoch seconds (local wall-clock time, like the bucket keys), stored as
+deltas from the previous reading like the reading ids. The per-reading
+timestamp (insert time) is left out.
+
+Layout of application/x-garden-series, little-endian, every column starting
+at a multiple of 4 bytes:
+
+    b'GSR1'
+    uint32 length of the header, then the header: UTF-8 JSON padded with spaces
+        {"series": [{"device_id", "sensor_name", "plant_unique_id",
+                     "count", "epoch0", "id0"}, ...], ...extra fields}
+    per series, count values each:
+        int32   epoch deltas (the first is 0; epoch = epoch0 + running sum)
+        int32   id deltas (likewise from id0)
+        float32 temperature, humidity, battery_charge (NaN for null)
+        uint8   sensor_state (255 for null), padded to 4 bytes
+"""
+
+import json
+import struct
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+SERIES_MIMETYPE = 'application/x-garden-series'
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+JSON_MIMETYPE = 'application/json'
+
+SERIES_MAGIC = b'GSR1'
+VALUE_COLUMNS = ('temperature', 'humidity', 'battery_charge')
+NULL_STATE = 255
+
+
+def negotiate_series_format(accept_mimetypes):
+    """Best series mimetype for a werkzeug MIMEAccept; JSON unless asked for"""
+    offered = [JSON_MIMETYPE, SERIES_MIMETYPE]
+    if msgpack is not None:
+        offered.append(MSGPACK_MIMETYPE)
+    # JSON comes first, so */* and browser defaults keep getting JSON
+    return accept_mimetypes.best_match(offered) or JSON_MIMETYPE
+
+
+def group_readings(readings):
+    """Split reading dicts into {device_id: [readings]}, in first-seen order"""
+    series = {}
+    for reading in readings:
+        series.setdefault(reading['device_id'], []).append(reading)
+    return series
+
+
+def _columns(readings):
+    """Delta-encoded columns of one series as (header, {name: ndarray})"""
+    count = len(readings)
+    first = readings[0] if readings else {}
+    if count:
+        stamps = np.array([f"{r['date']}T{r['time']}" for r in readings], dtype='datetime64[s]')
+        epochs = stamps.astype(np.int64)
+        ids = np.array([r['id'] for r in readings], dtype=np.int64)
+    else:
+        epochs = ids = np.zeros(0, dtype=np.int64)
+
+    columns = {
+        'epoch': np.diff(epochs, prepend=epochs[:1]).astype('<i4'),
+        'id': np.diff(ids, prepend=ids[:1]).astype('<i4')
+    }
+    for name in VALUE_COLUMNS:
+        columns[name] = np.array(
+            [r[name] for r in readings], dtype=np.float64
+        ).astype('<f4')
+    columns['sensor_state'] = np.array(
+        [NULL_STATE if r['sensor_state'] is None else r['sensor_state'] for r in readings], dtype=np.uint8
+    )
+
+    header = {
+        'device_id': first.get('device_id'),
+        'sensor_name': first.get('sensor_name'),
+        'plant_unique_id': first.get('plant_unique_id'),
+        'count': count,
+        'epoch0': int(epochs[0]) if count else None,
+        'id0': int(ids[0]) if count else None
+    }
+    return header, columns
+
+
+def _padded(data, fill=b'\0'):
+    return data + fill * (-len(data) % 4)
+
+
+def encode_series(series, **extra):
+    """Encode {device_id: [reading dicts]} as application/x-garden-series bytes.
+
+    Keyword arguments are added to the header (e.g. plants, next_cursor).
+    """
+    headers, parts = [], []
+    for device_id, readings in series.items():
+        header, columns = _columns(readings)
+        header['device_id'] = device_id
+        headers.append(header)
+        parts.extend(columns[name].tobytes() for name in ('epoch', 'id') + VALUE_COLUMNS)
+        parts.append(_padded(columns['sensor_state'].tobytes()))
+
+    meta = _padded(json.dumps(dict(extra, series=headers), separators=(',', ':')).encode('utf-8'), b' ')
+    return b''.join([SERIES_MAGIC, struct.pack('<I', len(meta)), meta] + parts)
+
+
+def encode_series_msgpack(series, **extra):
+    """Encode the same columns as MessagePack: one map per series"""
+    encoded = []
+    for device_id, readings in series.items():
+        header, columns = _columns(readings)
+        header['device_id'] = device_id
+        for name, values in columns.items():
+            if name in VALUE_COLUMNS:
+                header[name] = [None if np.isnan(v) else float(v) for v in values]
+            elif name == 'sensor_state':
+                header[name] = [None if v == NULL_STATE else int(v) for v in values]
+            else:
+                header[name] = values.tolist()
+        encoded.append(header)
+    return msgpack.packb(dict(extra, series=encoded), use_single_float=True)
+
+
+def encode_response_body(mimetype, series, **extra):
+    """Body for a negotiated binary mimetype, see negotiate_series_format"""
+    if mimetype == MSGPACK_MIMETYPE:
+        return encode_series_msgpack(series, **extra)
+    return encode_series(series, **extra)
@@ -0,0 +1,210 @@
+"""
+Garden Thresholds
+Resolves the effective humidity and temperature thresholds of plant types
+for a given day. Shared by the logger, the API server and the forecasts.
+
+The plant_thresholds table holds one row per plant type and season. It is
+compiled into an array of effective thresholds for every day of the year
+per plant type, so resolving a threshold is an array lookup. The table is
+only read again when it changes.
+
+Seasons are configured in the [seasons] section of garden.ini:
+
+    [seasons]
+    hemisphere = north           ; north or south
+    boundaries = meteorological  ; meteorological (1 Mar/Jun/Sep/Dec) or astronomical (equinoxes, solstices)
+    ; spring = 03-01             ; optional MM-DD start dates, override the boundaries
+    interpolate_days = 0         ; blend adjacent seasons' thresholds over this many days
+"""
+
+import configparser
+import threading
+from datetime import date
+
+import numpy as np
+
+from garden_db_schema import table_exists
+
+SEASONS = ('Winter', 'Spring', 'Summer', 'Autumn')
+THRESHOLD_COLUMNS = ('humidity_low', 'humidity_high', 'temperature_low', 'temperature_high')
+# Used where a plant type has no thresholds for the season
+DEFAULT_THRESHOLDS = {'humidity_low': 30, 'humidity_high': 70, 'temperature_low': 10, 'temperature_high': 30}
+
+# Northern hemisphere start dates (month, day) of each season
+SEASON_STARTS = {
+    'meteorological': {'Spring': (3, 1), 'Summer': (6, 1), 'Autumn': (9, 1), 'Winter': (12, 1)},
+    'astronomical': {'Spring': (3, 20), 'Summer': (6, 21), 'Autumn': (9, 22), 'Winter': (12, 21)}
+}
+OPPOSITE_SEASON = {'Winter': 'Summer', 'Spring': 'Autumn', 'Summer': 'Winter', 'Autumn': 'Spring'}
+
+DAYS_IN_YEAR = 365
+
+
+def day_of_year(day=None):
+    """Zero-based day of a 365-day year; 29 February counts as 28 February"""
+    day = day or date.today()
+    if day.month == 2 and day.day == 29:
+        day = day.replace(day=28)
+    return date(2001, day.month, day.day).timetuple().tm_yday - 1
+
+
+def load_season_settings(config_file='garden.ini'):
+    """Read the [seasons] section: (start dates {season: (month, day)}, interpolate_days).
+
+    Invalid values are reported and replaced by their defaults, so a typo in
+    garden.ini does not stop the logger or the API server.
+    """
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    section = config['seasons'] if config.has_section('seasons') else {}
+
+    hemisphere = section.get('hemisphere', 'north').strip().lower()
+    boundaries = section.get('boundaries', 'meteorological').strip().lower()
+    if hemisphere not in ('north', 'south'):
+        print(f"Warning: [seasons] hemisphere must be north or south, not {hemisphere!r}; using north")
+        hemisphere = 'north'
+    if boundaries not in SEASON_STARTS:
+        print(f"Warning: [seasons] boundaries must be meteorological or astronomical, not {boundaries!r}; "
+              "using meteorological")
+        boundaries = 'meteorological'
+
+    starts = dict(SEASON_STARTS[boundaries])
+    if hemisphere == 'south':
+        starts = {season: starts[OPPOSITE_SEASON[season]] for season in SEASONS}
+    overrides = {}
+    try:
+        for season in SEASONS:
+            value = section.get(season.lower())
+            if value:
+                month, day = (int(part) for part in value.strip().split('-'))
+                date(2001, month, day)
+                overrides[season] = (month, day)
+    except ValueError:
+        print(f"Warning: [seasons] {season.lower()} must be an MM-DD date, not {value!r}; "
+              f"using the {boundaries} seasons")
+        overrides = {}
+    starts.update(overrides)
+
+    try:
+        interpolate_days = int(section.get('interpolate_days', 0))
+    except ValueError:
+        print("Warning: [seasons] interpolate_days must be a whole number of days; using 0")
+        interpolate_days = 0
+    return starts, interpolate_days
+
+
+def season_calendar(starts, interpolate_days=0):
+    """Season of every day of the year, and how adjacent seasons are blended.
+
+    Returns (season, first, second, weight) arrays of DAYS_IN_YEAR entries:
+    the index (into SEASONS) of the season in effect, and the two seasons
+    whose thresholds are blended as (1 - weight) * first + weight * second.
+    Outside the interpolate_days around each boundary, first and second
+    are the season itself and weight is 0.
+    """
+    days = np.arange(DAYS_IN_YEAR)
+    order = sorted(SEASONS, key=lambda s: day_of_year(date(2001, *starts[s])))
+    start_days = np.array([day_of_year(date(2001, *starts[s])) for s in order])
+    index = np.array([SEASONS.index(s) for s in order])
+
+    # Days before the first start belong to the last season of the year
+    season = index[(np.searchsorted(start_days, days, side='right') - 1) % len(order)]
+    first, second = season.copy(), season.copy()
+    weight = np.zeros(DAYS_IN_YEAR)
+
+    half = interpolate_days / 2
+    if half > 0:
+        for k, boundary in enumerate(start_days):
+            # Signed distance to the boundary, across the turn of the year
+            offset = (days - boundary + DAYS_IN_YEAR // 2) % DAYS_IN_YEAR - DAYS_IN_YEAR // 2
+            near = (offset >= -half) & (offset < half)
+            first[near] = index[k - 1]
+            second[near] = index[k]
+            weight[near] = (offset[near] + half + 0.5) / (2 * half + 1)
+    return season, first, second, weight
+
+
+def _threshold_value(value):
+    """Round a compiled threshold; whole numbers are returned as int"""
+    if np.isnan(value):
+        return None
+    value = round(float(value), 1)
+    return int(value) if value.is_integer() else value
+
+
+class ThresholdResolver:
+    """Compiled (plant type, day of year) -> effective thresholds lookup"""
+
+    def __init__(self, config_file='garden.ini'):
+        self.starts, self.interpolate_days = load_season_settings(config_file)
+        self._season, self._first, self._second, self._weight = season_calendar(
+            self.starts, self.interpolate_days
+        )
+        self._rows = None
+        self._tables = {}
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def refresh(self, conn):
+        """Recompile when plant_thresholds changed since the last call.
+
+        The table is small, so its rows are compared directly. Returns True
+        when the lookup was recompiled.
+        """
+        rows = []
+        if table_exists(conn, 'plant_thresholds'):
+            rows = [tuple(row) for row in conn.execute(f'''
+                SELECT plant_type_id, season, {', '.join(THRESHOLD_COLUMNS)}
+                FROM plant_thresholds
+                ORDER BY plant_type_id, season
+            ''')]
+        with self._lock:
+            if rows == self._rows:
+                return False
+            self._tables = self._compile(rows)
+            self._rows = rows
+            self.version += 1
+        return True
+
+    def _compile(self, rows):
+        by_type = {}
+        for plant_type_id, season, *values in rows:
+            if season not in SEASONS:
+                continue
+            table = by_type.setdefault(plant_type_id, np.full((len(SEASONS), len(THRESHOLD_COLUMNS)), np.nan))
+            table[SEASONS.index(season)] = np.array(values, dtype=np.float64)
+
+        tables = {}
+        for plant_type_id, table in by_type.items():
+            first, second = table[self._first], table[self._second]
+            # A season without a value does not pull the blend towards NaN
+            first = np.where(np.isnan(first), second, first)
+            second = np.where(np.isnan(second), first, second)
+            weight = self._weight[:, None]
+            tables[plant_type_id] = (1 - weight) * first + weight * second
+        return tables
+
+    def season(self, day=None):
+        """Name of the season in effect on day (today by default)"""
+        return SEASONS[self._season[day_of_year(day)]]
+
+    def resolve(self, plant_type_id, day=None, fill_defaults=True):
+        """Effective thresholds of a plant type on day (today by default).
+
+        Missing thresholds are DEFAULT_THRESHOLDS, or None without fill_defaults.
+        """
+        table = self._tables.get(plant_type_id)
+        values = table[day_of_year(day)] if table is not None else np.full(len(THRESHOLD_COLUMNS), np.nan)
+        thresholds = {name: _threshold_value(value) for name, value in zip(THRESHOLD_COLUMNS, values)}
+        if fill_defaults:
+            for name, value in thresholds.items():
+                if value is None:
+                    thresholds[name] = DEFAULT_THRESHOLDS[name]
+        return thresholds
+
+    def cache_key(self, day=None):
+        """Changes whenever resolved thresholds may change: per season, or
+        per day while interpolating"""
+        if self.interpolate_days > 0:
+            return (self.version, day_of_year(day))
+        return (self.version, self.season(day))
@@ -0,0 +1,131 @@
+"""
+Tests for garden_analytics in incremental use: the logger inserts one
+reading per device per poll and runs anomaly detection and the moisture
+forecasts after each one.
+"""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+from garden_analytics import detect_anomalies, update_moisture_forecasts
+from garden_db_schema import create_base_tables, ensure_schema
+from garden_db_writer import insert_readings
+from garden_thresholds import ThresholdResolver
+
+DEVICES = ('dev-a', 'dev-b')
+
+
+def make_db():
+    conn = sqlite3.connect(':memory:')
+    create_base_tables(conn, ('sensor_readings',))
+    ensure_schema(conn)
+    return conn
+
+
+SERIES = [50.0 + (cycle % 4) * 0.2 for cycle in range(30)] + [95.0, 50.4, 150.0, 50.2, 50.0]
+
+
+def cycle_readings(cycle, humidity):
+    """One logger cycle: a reading per device, dev-a reading `humidity`"""
+    moment = datetime(2026, 10, 1) + timedelta(minutes=10 * cycle)
+    return [{
+        'plant_unique_id': f'U-{device_id}',
+        'sensor_name': f'S-{device_id}',
+        'device_id': device_id,
+        'date': moment.strftime('%Y-%m-%d'),
+        'time': moment.strftime('%H:%M:%S'),
+        'temperature': 20.0 + (cycle % 3) * 0.1,
+        'humidity': humidity if device_id == 'dev-a' else 50.0 + (cycle % 4) * 0.2,
+        'battery_charge': 90,
+        'sensor_state': 1,
+        'garden_plant_id': index + 1
+    } for index, device_id in enumerate(DEVICES)]
+
+
+def poll(conn, cycle, humidity):
+    """Insert one cycle and run detection, like the logger"""
+    insert_readings(conn, cycle_readings(cycle, humidity))
+    stored = detect_anomalies(conn)
+    conn.commit()
+    return stored
+
+
+def test_detects_anomalies_one_cycle_at_a_time():
+    conn = make_db()
+    stored = sum(poll(conn, cycle, humidity) for cycle, humidity in enumerate(SERIES))
+
+    found = conn.execute('''
+        SELECT device_id, metric, kind, value FROM sensor_anomalies ORDER BY reading_id
+    ''').fetchall()
+    assert found == [
+        ('dev-a', 'humidity', 'spike', 95.0),
+        ('dev-a', 'humidity', 'out_of_range', 150.0),
+    ]
+    assert stored == 2
+
+    progress = dict(conn.execute("SELECT name, value FROM analytics_state"))
+    last_ids = dict(conn.execute("SELECT device_id, MAX(id) FROM sensor_readings GROUP BY device_id"))
+    # Each device has scored everything but its latest reading
+    for device_id in DEVICES:
+        assert progress[f'anomalies:{device_id}'] < last_ids[device_id]
+        assert conn.execute(
+            "SELECT COUNT(*) FROM sensor_readings WHERE device_id = ? AND id > ?",
+            (device_id, progress[f'anomalies:{device_id}'])
+        ).fetchone()[0] == 1
+
+
+def test_incremental_matches_backfill():
+    incremental, backfill = make_db(), make_db()
+    for cycle, humidity in enumerate(SERIES):
+        poll(incremental, cycle, humidity)
+    # The same readings, scored in a single pass
+    insert_readings(backfill, [
+        reading for cycle, humidity in enumerate(SERIES) for reading in cycle_readings(cycle, humidity)
+    ])
+    detect_anomalies(backfill)
+
+    query = "SELECT reading_id, metric, kind FROM sensor_anomalies ORDER BY reading_id, metric"
+    assert incremental.execute(query).fetchall() == backfill.execute(query).fetchall()
+
+
+def test_forecasts_refit_only_sensors_with_new_readings(tmp_path):
+    conn = sqlite3.connect(':memory:')
+    create_base_tables(conn)
+    ensure_schema(conn)
+    conn.execute("INSERT INTO plant_types (id, name) VALUES (1, 'Tomato')")
+    for index, device_id in enumerate(DEVICES):
+        conn.execute('''
+            INSERT INTO garden_plants
+            (garden_layout_id, plant_type_id, custom_name, position_x, position_y,
+             has_sensor, sensor_id, sensor_name, unique_id)
+            VALUES (1, 1, ?, 10, 10, 1, ?, ?, ?)
+        ''', (device_id, device_id, f'S-{device_id}', f'U-{device_id}'))
+    thresholds = ThresholdResolver(str(tmp_path / 'missing.ini'))
+    thresholds.refresh(conn)
+
+    start = datetime.now() - timedelta(hours=12)
+
+    def drying(device_id, hour):
+        moment = start + timedelta(hours=hour)
+        return {
+            'plant_unique_id': f'U-{device_id}', 'sensor_name': f'S-{device_id}', 'device_id': device_id,
+            'date': moment.strftime('%Y-%m-%d'), 'time': moment.strftime('%H:%M:%S'),
+            'temperature': 20.0, 'humidity': 70.0 - hour, 'battery_charge': 90, 'sensor_state': 1
+        }
+
+    insert_readings(conn, [drying(device_id, hour) for hour in range(8) for device_id in DEVICES])
+    assert update_moisture_forecasts(conn, thresholds) == 2
+    conn.execute("UPDATE moisture_forecasts SET updated_at = '2000-01-01 00:00:00'")
+    conn.commit()
+
+    # Nothing new: no sensor is refit
+    assert update_moisture_forecasts(conn, thresholds) == 0
+    insert_readings(conn, [drying('dev-a', 8)])
+    assert update_moisture_forecasts(conn, thresholds) == 1
+
+    rows = dict(conn.execute("SELECT device_id, updated_at FROM moisture_forecasts"))
+    assert rows['dev-b'] == '2000-01-01 00:00:00'
+    assert rows['dev-a'] != '2000-01-01 00:00:00'
+    assert conn.execute(
+        "SELECT fitted_points FROM moisture_forecasts WHERE device_id = 'dev-a'"
+    ).fetchone()[0] == 9
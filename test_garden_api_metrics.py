@@ -0,0 +1,53 @@
+"""
+Tests for garden_api_metrics: profiling survives failing views, and the
+metrics endpoint is limited to loopback clients or the admin token.
+"""
+
+import pytest
+from flask import Flask
+
+import garden_api_metrics
+import garden_api_server
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    monkeypatch.setitem(garden_api_metrics.settings, 'profile', True)
+    monkeypatch.setitem(garden_api_metrics.settings, 'admin_token', '')
+    return garden_api_metrics.settings
+
+
+def test_profiler_is_released_when_the_view_raises(settings):
+    app = Flask(__name__)
+    app.testing = True  # exceptions propagate, as with debug=True
+    garden_api_metrics.init_app(app, config_file='missing.ini')
+
+    @app.route('/fail')
+    def fail():
+        raise RuntimeError('boom')
+
+    @app.route('/ok')
+    def ok():
+        return 'ok'
+
+    client = app.test_client()
+    with pytest.raises(RuntimeError):
+        client.get('/fail', headers={'X-Profile': '1'})
+    assert not garden_api_metrics._profiler_lock.locked()
+
+    client.get('/ok', headers={'X-Profile': '1'})
+    assert garden_api_metrics.snapshot()['profiles'][0]['path'].startswith('/ok')
+
+
+def test_admin_metrics_needs_loopback_or_token(settings, monkeypatch):
+    client = garden_api_server.app.test_client()
+    remote = {'REMOTE_ADDR': '192.168.1.20'}
+    assert client.get('/api/admin/metrics', environ_base=remote).status_code == 403
+    assert client.delete('/api/admin/metrics', environ_base=remote).status_code == 403
+    assert client.get('/api/admin/metrics').status_code == 200  # 127.0.0.1
+
+    monkeypatch.setitem(settings, 'admin_token', 's3cret')
+    assert client.get('/api/admin/metrics', environ_base=remote,
+                      headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.get('/api/admin/metrics', environ_base=remote,
+                      headers={'Authorization': 'Bearer s3cret'}).status_code == 200
@@ -0,0 +1,123 @@
+"""
+Tests for the API server's dashboard cache and change feed (/api/stream):
+layouts are built independently, and dashboard diffs are published per
+layout from the first write after a subscriber attaches.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import garden_api_server
+from garden_db_schema import create_base_tables, ensure_schema
+from garden_db_writer import insert_readings
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'garden_sensors.db')
+    conn = sqlite3.connect(path)
+    create_base_tables(conn)
+    ensure_schema(conn)
+    conn.execute("INSERT INTO plant_types (id, name) VALUES (1, 'Tomato')")
+    for layout in (1, 2):
+        conn.execute(
+            "INSERT INTO garden_layouts (id, name, boundary_points) VALUES (?, ?, ?)",
+            (layout, f'Garden {layout}', json.dumps([[0, 0], [100, 0], [100, 100], [0, 100]]))
+        )
+        conn.execute('''
+            INSERT INTO garden_plants
+            (garden_layout_id, plant_type_id, custom_name, position_x, position_y,
+             has_sensor, sensor_id, sensor_name, unique_id)
+            VALUES (?, 1, ?, 10, 10, 1, ?, ?, ?)
+        ''', (layout, f'Tomato {layout}', f'dev{layout}', f'S{layout}', f'U{layout}'))
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(garden_api_server, 'DB_FILE', path)
+    monkeypatch.setattr(garden_api_server, '_version_conn', None)
+    return path
+
+
+def write_reading(db_file, layout, humidity):
+    conn = sqlite3.connect(db_file)
+    insert_readings(conn, [{
+        'plant_unique_id': f'U{layout}', 'sensor_name': f'S{layout}', 'device_id': f'dev{layout}',
+        'date': '2026-10-19', 'time': f'12:{int(humidity):02d}:00', 'temperature': 20.0,
+        'humidity': humidity, 'battery_charge': 90, 'sensor_state': 1, 'garden_plant_id': layout
+    }])
+    conn.commit()
+    conn.close()
+
+
+def wait_for_events(feed, cursor, layout_key, count=1, timeout=5):
+    deadline = time.time() + timeout
+    while True:
+        _, events = feed.pending(cursor, layout_key)
+        if len(events) >= count or time.time() > deadline:
+            return events
+        time.sleep(0.02)
+
+
+def test_first_write_after_attaching_a_second_layout_is_published(db_file):
+    feed = garden_api_server.ChangeFeed(poll_interval=0.02)
+    feed.attach(layout_key=1)
+    # Let the watcher run before the second layout attaches
+    time.sleep(0.1)
+    cursor, reset = feed.attach(layout_key=2)
+    assert not reset
+
+    write_reading(db_file, 2, 41.0)
+    events = wait_for_events(feed, cursor, 2)
+    assert [name for _, name, _ in events] == ['sensors']
+    assert json.loads(events[0][2])['dev2']['humidity'] == 41.0
+
+    feed.detach(2)
+    feed.detach(1)
+
+
+def test_reconnect_gets_changes_made_while_disconnected(db_file):
+    feed = garden_api_server.ChangeFeed(poll_interval=0.02)
+    cursor, _ = feed.attach(layout_key=1)
+    write_reading(db_file, 1, 42.0)
+    events = wait_for_events(feed, cursor, 1)
+    assert len(events) == 1
+    last_event_id = events[-1][0]
+    feed.detach(1)
+
+    write_reading(db_file, 1, 43.0)
+    cursor, reset = feed.attach(last_event_id, layout_key=1)
+    assert not reset
+    events = wait_for_events(feed, cursor, 1)
+    assert [json.loads(data)['dev1']['humidity'] for _, _, data in events] == [43.0]
+    feed.detach(1)
+
+
+def test_cold_build_of_one_layout_does_not_block_another(db_file, monkeypatch):
+    assert garden_api_server.get_dashboard_entry(2) is not None
+    write_reading(db_file, 1, 44.0)  # layout 1 is stale, layout 2 is still current
+
+    building = threading.Event()
+    release = threading.Event()
+    build = garden_api_server.build_dashboard_payload
+
+    def slow_build(conn, layout_id):
+        building.set()
+        release.wait(5)
+        return build(conn, layout_id)
+
+    monkeypatch.setattr(garden_api_server, 'build_dashboard_payload', slow_build)
+    worker = threading.Thread(target=garden_api_server.get_dashboard_entry, args=(1,))
+    worker.start()
+    try:
+        assert building.wait(5)
+        started = time.time()
+        entry = garden_api_server.get_dashboard_entry(2)
+        assert entry is not None and time.time() - started < 1
+    finally:
+        release.set()
+        worker.join()
+    assert garden_api_server.get_dashboard_entry(1)['payload']['sensor_data']['dev1']['humidity'] == 44.0
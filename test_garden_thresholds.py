@@ -0,0 +1,38 @@
+"""
+Tests for the [seasons] settings of garden_thresholds: invalid values in
+garden.ini fall back to the defaults instead of raising.
+"""
+
+from garden_thresholds import SEASON_STARTS, ThresholdResolver, load_season_settings
+
+
+def write_config(tmp_path, lines):
+    path = tmp_path / 'garden.ini'
+    path.write_text('[seasons]\n' + '\n'.join(lines) + '\n')
+    return str(path)
+
+
+def test_start_date_overrides_are_applied(tmp_path):
+    starts, interpolate_days = load_season_settings(write_config(tmp_path, [
+        'spring = 03-15', 'interpolate_days = 10'
+    ]))
+    assert starts['Spring'] == (3, 15)
+    assert starts['Summer'] == SEASON_STARTS['meteorological']['Summer']
+    assert interpolate_days == 10
+
+
+def test_invalid_start_date_falls_back_to_default_seasons(tmp_path, capsys):
+    for value in ('March 1', '02-30', '3-1-2'):
+        config_file = write_config(tmp_path, ['spring = 03-15', f'autumn = {value}'])
+        assert load_season_settings(config_file) == (SEASON_STARTS['meteorological'], 0)
+        assert 'Warning: [seasons] autumn' in capsys.readouterr().out
+    # The resolver still builds its season calendar
+    assert ThresholdResolver(config_file).resolve(1)['humidity_low'] is not None
+
+
+def test_invalid_hemisphere_and_interpolation_use_defaults(tmp_path):
+    starts, interpolate_days = load_season_settings(write_config(tmp_path, [
+        'hemisphere = east', 'boundaries = lunar', 'interpolate_days = two weeks'
+    ]))
+    assert starts == SEASON_STARTS['meteorological']
+    assert interpolate_days == 0